@@ -0,0 +1,391 @@
+# Benchmarks for the gnotepad editor core on generated corpora.
+#
+#   python benchmarks/bench.py                      # 1 KB .. 16 MB
+#   python benchmarks/bench.py --full -o out.json   # up to 500 MB
+#   xvfb-run python benchmarks/bench.py --tk        # adds the Tk widget tier
+#
+# Corpora are generated from a fixed seed, so two runs with the same
+# arguments measure the same bytes. Results are printed as JSON.
+
+import argparse
+import gc
+import json
+import os
+import platform
+import queue
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gnotepad_core import (
+    DocumentStats, EditDelta, FileFormat, FileLoader, LargeFileDocument, ModificationTracker,
+    PieceTable, SearchEngine, SearchQuery, SearchRun, UndoHistory,
+    replacement_deltas, replacements, write_file_atomic,
+)
+
+DEFAULT_SIZES = "1K,64K,1M,16M"
+FULL_SIZES = "1K,64K,1M,16M,128M,500M"
+CORPORA = ("ascii-lines", "cjk-lines", "ascii-line", "cjk-line")
+OPERATIONS = ("open", "open-indexed", "save", "search", "search-regex", "replace-all", "undo-redo", "typing")
+TK_OPERATIONS = ("tk-load", "tk-typing", "tk-replace-all")
+TK_SIZE_LIMIT = 16 << 20
+GENERATE_CHUNK = 1 << 20
+KEYSTROKES = 2000
+NEEDLES = {"ascii": "needle", "cjk": "検索"}
+_UNITS = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+
+
+def parse_size(text):
+    text = text.strip().upper().rstrip("B")
+    if text and text[-1] in _UNITS:
+        return int(float(text[:-1]) * _UNITS[text[-1]])
+    return int(text)
+
+
+def _vocabulary(rng, script):
+    if script == "cjk":
+        words = ["".join(chr(rng.randint(0x4E00, 0x9FFF)) for _ in range(rng.randint(1, 3))) for _ in range(2000)]
+    else:
+        words = ["".join(rng.choices("abcdefghijklmnopqrstuvwxyz", k=rng.randint(2, 10))) for _ in range(2000)]
+    # One word in about two thousand is the search needle.
+    words.append(NEEDLES[script])
+    return words
+
+
+def _generate_chunk(rng, words, script, single_line):
+    separator = "" if script == "cjk" else " "
+    count = GENERATE_CHUNK // (3 if script == "cjk" else 7)
+    picked = rng.choices(words, k=count)
+    if single_line:
+        return separator.join(picked)
+    width = 12 if script == "cjk" else 10
+    return "\n".join(separator.join(picked[index:index + width]) for index in range(0, count, width)) + "\n"
+
+
+def corpus_path(directory, kind, size, seed):
+    # Corpora are written once per (kind, size, seed) and reused by later
+    # runs, since generating the largest ones takes longer than measuring.
+    path = os.path.join(directory, f"{kind}-{size}-{seed}.txt")
+    if os.path.exists(path) and os.path.getsize(path) == size:
+        return path
+    script, shape = kind.split("-")
+    rng = random.Random(f"{kind}:{seed}")
+    words = _vocabulary(rng, script)
+    written = 0
+    with open(path + ".tmp", "wb") as file:
+        while written < size:
+            data = _generate_chunk(rng, words, script, shape == "line").encode("utf-8")
+            if written + len(data) > size:
+                data = data[:size - written].decode("utf-8", "ignore").encode("utf-8")
+                data += b" " * (size - written - len(data))
+            file.write(data)
+            written += len(data)
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def _timed(function, repeat):
+    timings = []
+    extra = {}
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        extra = function() or {}
+        timings.append(time.perf_counter() - start)
+    return {"seconds": min(timings), "median_seconds": statistics.median(timings), "runs": repeat, **extra}
+
+
+def _percentiles(samples):
+    samples = sorted(samples)
+    return {
+        "p50_ms": samples[len(samples) // 2] * 1000,
+        "p99_ms": samples[min(len(samples) - 1, len(samples) * 99 // 100)] * 1000,
+        "max_ms": samples[-1] * 1000,
+    }
+
+
+def read_text(path):
+    loader = FileLoader(path)
+    parts = []
+    first_chunk = None
+    start = time.perf_counter()
+    while not (loader.done and loader.chunks.empty()):
+        try:
+            text, _counts = loader.chunks.get(timeout=0.001)
+        except queue.Empty:
+            continue
+        if first_chunk is None:
+            first_chunk = time.perf_counter() - start
+        parts.append(text)
+    if loader.error is not None:
+        raise loader.error
+    return "".join(parts), loader.file_format, first_chunk or 0.0
+
+
+def bench_open(path, text, needle, repeat):
+    def run():
+        loaded, _file_format, first_chunk = read_text(path)
+        PieceTable(loaded)
+        return {"first_chunk_ms": first_chunk * 1000}
+    return _timed(run, repeat)
+
+
+def bench_open_indexed(path, text, needle, repeat):
+    def run():
+        document = LargeFileDocument(path)
+        first_window = time.perf_counter()
+        document.read_lines(0, 3000)
+        first_window = time.perf_counter() - first_window
+        while not document.indexed:
+            time.sleep(0.001)
+        lines = document.line_count
+        document.close()
+        return {"first_window_ms": first_window * 1000, "lines": lines}
+    return _timed(run, repeat)
+
+
+def bench_save(path, text, needle, repeat):
+    target = path + ".saved"
+    file_format = FileFormat(newline="\n")
+    try:
+        return _timed(lambda: write_file_atomic(target, text, file_format), repeat)
+    finally:
+        if os.path.exists(target):
+            os.remove(target)
+
+
+def _search(text, query):
+    def run():
+        search = SearchRun(SearchEngine(), text, query)
+        first_slice = time.perf_counter()
+        search.step()
+        first_slice = time.perf_counter() - first_slice
+        while not search.done:
+            search.step()
+        return {"matches": len(search.spans), "first_slice_ms": first_slice * 1000}
+    return run
+
+
+def bench_search(path, text, needle, repeat):
+    return _timed(_search(text, SearchQuery(needle)), repeat)
+
+
+def bench_search_regex(path, text, needle, repeat):
+    return _timed(_search(text, SearchQuery(needle + r"\w*", regex=True)), repeat)
+
+
+def bench_replace_all(path, text, needle, repeat):
+    query = SearchQuery(needle)
+
+    def run():
+        document = PieceTable(text)
+        spans, texts = replacements(SearchEngine(), text, query, "pin")
+        document.replace_spans(text, spans, texts)
+        deltas = list(replacement_deltas(text, spans, texts))
+        history = UndoHistory(document)
+        history.begin_group()
+        for delta in deltas:
+            history.record(delta)
+        history.end_group()
+        return {"replaced": len(spans)}
+    return _timed(run, repeat)
+
+
+def _typed(text, count):
+    # Typing in the middle of the document, a word at a time, with the
+    # occasional backspace.
+    rng = random.Random(len(text))
+    document = PieceTable(text)
+    offset = len(text) // 2
+    deltas = []
+    for index in range(count):
+        if index % 11 == 10:
+            offset -= 1
+            delta = EditDelta(offset, document.get(offset, offset + 1), "")
+        else:
+            delta = EditDelta(offset, "", " " if index % 7 == 6 else rng.choice("etaoinshrdlu"))
+            offset += 1
+        document.apply(delta)
+        deltas.append(delta)
+    return deltas
+
+
+def bench_undo_redo(path, text, needle, repeat):
+    deltas = _typed(text, KEYSTROKES)
+
+    def run():
+        document = PieceTable(text)
+        history = UndoHistory(document)
+        history.max_stack_size = len(deltas)
+        history.group_timeout = float("inf")
+        for delta in deltas:
+            document.apply(delta)
+            history.record(delta)
+        groups = len(history.undo_stack)
+        start = time.perf_counter()
+        while history.undo_stack:
+            history.undo()
+        undo = time.perf_counter() - start
+        while history.redo_stack:
+            history.redo()
+        return {"groups": groups, "undo_ms": undo * 1000, "redo_ms": (time.perf_counter() - start - undo) * 1000}
+    return _timed(run, repeat)
+
+
+def bench_typing(path, text, needle, repeat):
+    deltas = _typed(text, KEYSTROKES)
+
+    def run():
+        document = PieceTable(text)
+        tracker = ModificationTracker(fetch=document.get)
+        stats = DocumentStats()
+        samples = []
+        for delta in deltas:
+            start = time.perf_counter()
+            document.apply(delta)
+            tracker.record(delta)
+            end = delta.offset + len(delta.inserted)
+            stats.apply(delta, document.get(delta.offset - 1, delta.offset), document.get(end, end + 1))
+            samples.append(time.perf_counter() - start)
+        return {"keystrokes": len(samples), **_percentiles(samples)}
+    return _timed(run, repeat)
+
+
+class TkTier:
+    def __init__(self):
+        import tkinter as tk
+        import gnotepad
+        self.tk = tk
+        self.gnotepad = gnotepad
+        self.root = tk.Tk()
+        self.root.withdraw()
+
+    def _text_area(self, text=""):
+        text_area = self.tk.Text(self.root, undo=False, wrap="none")
+        edits = []
+        recorder = self.gnotepad.TextEditRecorder(text_area, edits.append)
+        if text:
+            recorder.set_text(text)
+        return text_area, recorder, edits
+
+    def _destroy(self, text_area, recorder):
+        recorder.close()
+        text_area.destroy()
+
+    def load(self, path, text, needle, repeat):
+        batch_size = self.gnotepad.LOAD_BATCH_SIZE
+
+        def run():
+            text_area, recorder, _edits = self._text_area()
+            for start in range(0, len(text), batch_size):
+                text_area.insert("end-1c", text[start:start + batch_size])
+            self.root.update_idletasks()
+            self._destroy(text_area, recorder)
+        return _timed(run, repeat)
+
+    def typing(self, path, text, needle, repeat):
+        deltas = _typed(text, KEYSTROKES)
+
+        def run():
+            text_area, recorder, _edits = self._text_area(text)
+            samples = []
+            for delta in deltas:
+                start = time.perf_counter()
+                index = recorder.document.index(delta.offset)
+                if delta.removed:
+                    text_area.delete(index)
+                else:
+                    text_area.insert(index, delta.inserted)
+                self.root.update_idletasks()
+                samples.append(time.perf_counter() - start)
+            self._destroy(text_area, recorder)
+            return {"keystrokes": len(samples), **_percentiles(samples)}
+        return _timed(run, repeat)
+
+    def replace_all(self, path, text, needle, repeat):
+        query = SearchQuery(needle)
+
+        def run():
+            text_area, recorder, _edits = self._text_area(text)
+            spans, texts = replacements(SearchEngine(), text, query, "pin")
+            recorder.replace_spans(text, spans, texts)
+            self.root.update_idletasks()
+            self._destroy(text_area, recorder)
+            return {"replaced": len(spans)}
+        return _timed(run, repeat)
+
+
+BENCHMARKS = {
+    "open": bench_open,
+    "open-indexed": bench_open_indexed,
+    "save": bench_save,
+    "search": bench_search,
+    "search-regex": bench_search_regex,
+    "replace-all": bench_replace_all,
+    "undo-redo": bench_undo_redo,
+    "typing": bench_typing,
+}
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the gnotepad editor core on generated corpora.")
+    parser.add_argument("--sizes", help=f"comma separated corpus sizes (default {DEFAULT_SIZES})")
+    parser.add_argument("--full", action="store_true", help=f"use {FULL_SIZES}")
+    parser.add_argument("--corpora", default=",".join(CORPORA), help="comma separated corpus kinds")
+    parser.add_argument("--operations", default=",".join(OPERATIONS), help="comma separated operations")
+    parser.add_argument("--tk", action="store_true", help="also time the Tk text widget (needs a display, e.g. xvfb-run)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--corpus-dir", default=os.path.join(tempfile.gettempdir(), "gnotepad-bench"))
+    parser.add_argument("-o", "--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    sizes = [parse_size(size) for size in (args.sizes or (FULL_SIZES if args.full else DEFAULT_SIZES)).split(",")]
+    operations = [(name, BENCHMARKS[name]) for name in args.operations.split(",")]
+    if args.tk:
+        tier = TkTier()
+        operations += zip(TK_OPERATIONS, (tier.load, tier.typing, tier.replace_all))
+    os.makedirs(args.corpus_dir, exist_ok=True)
+
+    results = []
+    for kind in args.corpora.split(","):
+        needle = NEEDLES[kind.split("-")[0]]
+        for size in sizes:
+            path = corpus_path(args.corpus_dir, kind, size, args.seed)
+            text = read_text(path)[0]
+            for name, benchmark in operations:
+                result = {"corpus": kind, "size": size, "operation": name}
+                if name.startswith("tk-") and size > TK_SIZE_LIMIT:
+                    result["skipped"] = f"larger than {TK_SIZE_LIMIT} bytes"
+                else:
+                    result.update(benchmark(path, text, needle, args.repeat))
+                results.append(result)
+                print(f"{kind:12} {size:>11,} {name:15} {result.get('seconds', 0) * 1000:10.1f} ms", file=sys.stderr)
+            del text
+
+    report = {"version": 1, "seed": args.seed, "environment": environment(), "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=1)
+    else:
+        json.dump(report, sys.stdout, indent=1)
+        print()
+
+
+if __name__ == "__main__":
+    main()
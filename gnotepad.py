@@ -1,12 +1,28 @@
+import time
+# Taken before the heavy imports so --startup-profile can report them.
+_START_TIME = time.perf_counter()
+
 import customtkinter as ctk
 import tkinter as tk
 from tkinter import filedialog, messagebox, font as tkFont
 from PIL import Image, ImageTk
 import os
+import functools
+import itertools
 import re
 from typing import Optional
-import webbrowser
 import sys
+import queue
+import collections
+import json
+from gnotepad_core import (
+    ASCII_COMPATIBLE_ENCODINGS, FIND_MAX_RESULTS, JOURNAL_COMPACT_BYTES, TAG_BATCH_SIZE,
+    DocumentStats, EditDelta, FileFormat, FileLoader, FileSearch, FuzzyIndex, IndexConverter,
+    JournalWriter, LargeFileDocument, ModificationTracker, PieceTable, SaveJob, SaveWorker,
+    JOURNAL_LOCK, SearchEngine, SearchMatches, SearchQuery, SearchRun, SessionStore, UndoHistory,
+    CompressedText, detect_file_format, format_size, orphaned_journals,
+    replacement_deltas, replacements, replay_journal, tk_length, update_matches,
+)
 
 def resource_path(relative_path):
     try:
@@ -21,15 +37,29 @@ ctk.set_appearance_mode("dark")
 ctk.set_default_color_theme("blue")
 
 ICON_SIZE = (20, 20)
+LOAD_BATCH_SIZE = 1 << 20
+LARGE_FILE_THRESHOLD = 256 << 20
+
+
+@functools.lru_cache(maxsize=None)
+def load_image(path):
+    image = Image.open(path)
+    image.load()
+    return image
+
+
+@functools.lru_cache(maxsize=None)
+def load_photo_image(path):
+    return ImageTk.PhotoImage(load_image(path))
 
 
 def set_main_app_icon(window, icon_path):
     if not os.path.exists(icon_path):
         try:
-            blank_icon = Image.new('RGBA', (16, 16), (0, 0, 0, 0))
-            photo = ImageTk.PhotoImage(blank_icon)
-            window.iconphoto(True, photo)
-            window._icon = photo
+            if not hasattr(window, "_icon"):
+                blank_icon = Image.new('RGBA', (16, 16), (0, 0, 0, 0))
+                window._icon = ImageTk.PhotoImage(blank_icon)
+            window.iconphoto(True, window._icon)
         except:
             pass
         return
@@ -41,10 +71,7 @@ def set_main_app_icon(window, icon_path):
         pass
 
     try:
-        img = Image.open(icon_path)
-        photo = ImageTk.PhotoImage(img)
-        window.iconphoto(True, photo)
-        window._icon = photo
+        window.iconphoto(True, load_photo_image(icon_path))
         return
     except Exception:
         pass
@@ -54,10 +81,7 @@ def set_main_app_icon(window, icon_path):
 
 def set_main_app_icon_delayed(window, icon_path):
     try:
-        img = Image.open(icon_path)
-        photo = ImageTk.PhotoImage(img)
-        window.iconphoto(True, photo)
-        window._icon = photo
+        window.iconphoto(True, load_photo_image(icon_path))
     except Exception:
         pass
 
@@ -88,10 +112,26 @@ def apply_dark_titlebar(window):
         pass
 
 
+@functools.lru_cache(maxsize=None)
+def font_families():
+    families = sorted(tkFont.families())
+    return families, [family.lower() for family in families]
+
+
+def filter_fonts(text):
+    families, lowered = font_families()
+    text = text.strip().lower()
+    if not text:
+        return families
+    prefix = [family for family, name in zip(families, lowered) if name.startswith(text)]
+    contains = [family for family, name in zip(families, lowered) if text in name and not name.startswith(text)]
+    return prefix + contains
+
+
+@functools.lru_cache(maxsize=None)
 def load_ctk_icon(path: str, size=ICON_SIZE):
     try:
-        img = Image.open(path)
-        return ctk.CTkImage(img, size=size)
+        return ctk.CTkImage(load_image(path), size=size)
     except Exception:
         return None
 
@@ -147,73 +187,713 @@ tk.Toplevel = _PatchedToplevel
 
 
 
-class UndoRedoManager:
-    def __init__(self, text_widget):
+def text_index(offset):
+    return f"1.0+{offset}c"
+
+
+_PROXY_PROC = """
+proc %(widget)s {args} {
+    switch -exact -- [lindex $args 0] {
+        insert - delete - replace {
+            lassign [%(handler)s {*}$args] status result
+            return -code $status $result
+        }
+    }
+    tailcall %(orig)s {*}$args
+}
+"""
+
+
+_REPLACE_SPANS_PROC = """
+proc %(name)s {orig ranges texts} {
+    foreach {first last} $ranges text $texts {
+        $orig replace $first $last $text
+    }
+}
+"""
+REPLACE_BATCH_SIZE = 4096
+
+
+class TextEditRecorder:
+    def __init__(self, text_widget, callback, document=None, replace_callback=None):
         self.text_widget = text_widget
-        self.undo_stack = []
-        self.redo_stack = []
-        self.current_text = ""
-        self.max_stack_size = 100
-        
-    def save_state(self):
+        self.callback = callback
+        self.replace_callback = replace_callback
+        self.document = document if document is not None else PieceTable()
+        self.last_index = "1.0"
+        self._tk = text_widget.tk
+        self._widget = text_widget._w
+        self._orig = self._widget + "_orig"
+        self._handler = self._widget + "_edit"
+        self._replace_proc = None
+        self._tk.call("rename", self._widget, self._orig)
+        self._tk.createcommand(self._handler, self._dispatch)
+        self._tk.eval(_PROXY_PROC % {"widget": self._widget, "orig": self._orig, "handler": self._handler})
+
+    def close(self):
+        if self._replace_proc is not None:
+            self._tk.call("rename", self._replace_proc, "")
+        self._tk.call("rename", self._widget, "")
+        self._tk.deletecommand(self._handler)
+        self._tk.call("rename", self._orig, self._widget)
+
+    def _call(self, *args):
+        return self._tk.call((self._orig,) + args)
+
+    @property
+    def length(self):
+        return len(self.document)
+
+    def clear(self):
+        self._call("delete", "1.0", "end")
+        self.document.clear()
+        self.last_index = "1.0"
+
+    def set_text(self, text):
+        self.clear()
+        self._call("insert", "1.0", text)
+        self.document.insert(0, text)
+
+    def _dispatch(self, operation, *args):
+        tracer = EventTracer.active
+        if tracer is not None:
+            return tracer.record(self._tk, "TextEditRecorder." + operation, "edit", self._perform, operation, args)
+        return self._perform(operation, args)
+
+    def _perform(self, operation, args):
+        try:
+            if self._call("cget", "-state") == "disabled":
+                return ("ok", "")
+            return ("ok", getattr(self, "_" + operation)(*args))
+        except tk.TclError as e:
+            return ("error", str(e))
+
+    def _resolve(self, index):
+        index = self._call("index", index)
+        if self._call("compare", index, ">", "end-1c"):
+            index = self._call("index", "end-1c")
+        return index
+
+    def offset_of(self, index):
+        return self.document.offset_of_index(self._call("index", index))
+
+    def _insert(self, index, *chars_and_tags):
+        index = self._resolve(index)
+        inserted = "".join(chars_and_tags[0::2])
+        offset = self.offset_of(index)
+        result = self._call("insert", index, *chars_and_tags)
+        self.last_index = index
+        if inserted:
+            self._record(EditDelta(offset, "", inserted))
+        return result
+
+    def _delete(self, first, last=None, *more):
+        if more:
+            ranges = [(first, last)] + [(more[i], more[i + 1] if i + 1 < len(more) else None) for i in range(0, len(more), 2)]
+            for _offset, first, last in sorted(((self.offset_of(self._resolve(a)), a, b) for a, b in ranges), reverse=True):
+                self._delete(first, last)
+            return ""
+        first = self._resolve(first)
+        last = self._resolve(last if last is not None else f"{first}+1c")
+        if not self._call("compare", first, "<", last):
+            return ""
+        removed = self._call("get", first, last)
+        offset = self.offset_of(first)
+        result = self._call("delete", first, last)
+        self.last_index = first
+        self._record(EditDelta(offset, removed, ""))
+        return result
+
+    def _replace(self, first, last, *chars_and_tags):
+        first = self._resolve(first)
+        last = self._resolve(last)
+        if not self._call("compare", first, "<=", last):
+            return self._call("replace", first, last, *chars_and_tags)
+        removed = self._call("get", first, last)
+        offset = self.offset_of(first)
+        result = self._call("replace", first, last, *chars_and_tags)
+        self.last_index = first
+        self._record(EditDelta(offset, removed, "".join(chars_and_tags[0::2])))
+        return result
+
+    def replace_spans(self, content, spans, texts):
+        # Replaces each (start, end) span of content, the current text, with
+        # the matching entry of texts. The edits run from the last span to
+        # the first in batched Tcl calls, so earlier indices stay valid, and
+        # the document is rebuilt once at the end. replace_callback gets the
+        # whole edit as one delta over the replaced range along with one
+        # delta per span in the order they were applied; without it, the
+        # span deltas go to callback one by one.
+        if not spans or self._call("cget", "-state") == "disabled":
+            return False
+        if self._replace_proc is None:
+            self._replace_proc = self._widget + "_replace_spans"
+            self._tk.eval(_REPLACE_SPANS_PROC % {"name": self._replace_proc})
+
+        texts = list(texts)
+        indices = IndexConverter(content).convert(itertools.chain.from_iterable(spans))
+        for start in reversed(range(0, len(spans), REPLACE_BATCH_SIZE)):
+            stop = min(start + REPLACE_BATCH_SIZE, len(spans))
+            pairs = list(zip(indices[2 * start:2 * stop:2], indices[2 * start + 1:2 * stop:2]))
+            pairs.reverse()
+            self._tk.call(self._replace_proc, self._orig, tuple(itertools.chain.from_iterable(pairs)), tuple(reversed(texts[start:stop])))
+            self.last_index = indices[2 * start]
+
+        low, high = spans[0][0], spans[-1][1]
+        self.document.replace_spans(content, spans, texts)
+        growth = len(self.document) - len(content)
+        deltas = list(replacement_deltas(content, spans, texts))
+        if self.replace_callback is not None:
+            self.replace_callback(EditDelta(low, content[low:high], self.document.get(low, high + growth)), deltas)
+        else:
+            for delta in deltas:
+                self.callback(delta)
+        return True
 
-        current = self.text_widget.get("1.0", "end-1c")
-        if current != self.current_text:
-            if len(self.undo_stack) >= self.max_stack_size:
-                self.undo_stack.pop(0)
-            self.undo_stack.append(self.current_text)
-            self.current_text = current
-            self.redo_stack.clear()
-    
-    def undo(self):
+    def _record(self, delta):
+        self.document.apply(delta)
+        self.callback(delta)
 
-        if self.undo_stack:
-            self.redo_stack.append(self.current_text)
-            self.current_text = self.undo_stack.pop()
-            self.text_widget.delete("1.0", "end")
-            self.text_widget.insert("1.0", self.current_text)
-    
-    def redo(self):
 
-        if self.redo_stack:
-            self.undo_stack.append(self.current_text)
-            self.current_text = self.redo_stack.pop()
-            self.text_widget.delete("1.0", "end")
-            self.text_widget.insert("1.0", self.current_text)
+class LargeFileView:
+    window_lines = 3000
+    margin_lines = 1000
+
+    def __init__(self, document, text_widget, recorder, scrollbar):
+        self.document = document
+        self.text_widget = text_widget
+        self.recorder = recorder
+        self.scrollbar = scrollbar
+        self.first_line = 0
+        self.line_count = 0
+        self.match = None
+        self.match_end = None
+        self.search_pattern = None
+        self._search = None
+        self._search_id = None
+        self._repage_id = None
+        self._loaded_total = 0
+        self.load_window(0)
+
+    def close(self):
+        self.cancel_search()
+        if self._repage_id is not None:
+            self.text_widget.after_cancel(self._repage_id)
+        self.document.close()
+
+    def _window_start(self, top_line):
+        return max(0, min(top_line - self.margin_lines, self.document.line_count - self.window_lines))
+
+    def load_window(self, top_line):
+        first = self._window_start(top_line)
+        self._loaded_total = self.document.line_count
+        text = self.document.read_lines(first, self.window_lines)
+        self.first_line = first
+        self.line_count = text.count("\n") + 1
+        self.text_widget.configure(state="normal")
+        # Straight to the widget: a window is not an edit, and the first one
+        # loads before the tab knows it has a large file view.
+        self.recorder.set_text(text)
+        self.text_widget.configure(state="disabled")
+        self.text_widget.yview(self.local_index(top_line, 0))
+        self._show_match()
+
+    def local_index(self, line, column):
+        return f"{line - self.first_line + 1}.{column}"
+
+    def global_position(self, index):
+        line, column = index.split(".")
+        return self.first_line + int(line) - 1, int(column)
+
+    def _contains(self, line, margin=0):
+        window_end = self.first_line + self.line_count
+        at_end = window_end >= self.document.line_count
+        return self.first_line + (margin if self.first_line else 0) <= line < window_end - (0 if at_end else margin)
+
+    def _show_match(self):
+        self.text_widget.tag_remove("current_match", "1.0", tk.END)
+        if self.match is None:
+            return
+        line, start, end = self.match
+        if self._contains(line):
+            first = self.local_index(line, start)
+            self.text_widget.tag_add("current_match", first, self.local_index(line, end))
+            self.text_widget.mark_set(tk.INSERT, first)
+            self.text_widget.see(first)
+
+    def show_match(self, line, start, end):
+        self.match = (line, start, end)
+        if self._contains(line, self.margin_lines // 2):
+            self._show_match()
+        else:
+            self.load_window(line)
+
+    def on_yscroll(self, first, last):
+        total = max(self.document.line_count, 1)
+        top = self.first_line + float(first) * self.line_count
+        bottom = self.first_line + float(last) * self.line_count
+        self.scrollbar.set(top / total, min(1.0, bottom / total))
+        if not (self._contains(int(top), self.margin_lines // 2) and self._contains(int(bottom) - 1, self.margin_lines // 2)):
+            if self._repage_id is None:
+                self._repage_id = self.text_widget.after_idle(self._repage)
+
+    def _repage(self):
+        self._repage_id = None
+        top_line, _column = self.global_position(self.text_widget.index("@0,0"))
+        if self._window_start(top_line) == self.first_line and self._loaded_total == self.document.line_count:
+            return
+        cursor = self.global_position(self.text_widget.index(tk.INSERT))
+        self.load_window(top_line)
+        if self._contains(cursor[0]):
+            self.text_widget.mark_set(tk.INSERT, self.local_index(*cursor))
+
+    def yview(self, *args):
+        if args and args[0] == "moveto":
+            target = min(int(float(args[1]) * self.document.line_count), self.document.line_count - 1)
+            if self._contains(target, self.margin_lines):
+                self.text_widget.yview(self.local_index(target, 0))
+            else:
+                self.load_window(target)
+        else:
+            self.text_widget.yview(*args)
+
+    def cancel_search(self):
+        if self._search_id is not None:
+            self.text_widget.after_cancel(self._search_id)
+            self._search_id = None
+        self._search = None
+
+    def find_next(self, pattern, overlap, on_status):
+        self.cancel_search()
+        if pattern != self.search_pattern or self.match_end is None:
+            cursor_line, _column = self.global_position(self.text_widget.index(tk.INSERT))
+            self.match_end = self.document.line_start(cursor_line)
+        self.search_pattern = pattern
+        self._search = (self.match_end, self.match_end, False)
+        self._search_step(overlap, on_status)
+
+    def _search_step(self, overlap, on_status):
+        self._search_id = None
+        position, origin, wrapped = self._search
+        match, position = self.document.search_step(self.search_pattern, position, overlap)
+        if match is not None and not (wrapped and match.start() >= origin):
+            self._search = None
+            self.match_end = match.end()
+            line, start = self.document.column_of(match.start())
+            self.show_match(line, start, start + tk_length(self.document.decode(match.start(), match.end())))
+            on_status(None)
+            return
+        if match is None and position is None and not wrapped and origin > 0:
+            position, wrapped = 0, True
+        if match is not None or position is None or wrapped and position >= origin:
+            self._search = None
+            on_status("Text not found")
+            return
+        self._search = (position, origin, wrapped)
+        on_status(f"Searching... {position / self.document.size:.0%}")
+        self._search_id = self.text_widget.after(1, self._search_step, overlap, on_status)
+
 
+class UndoRedoManager(UndoHistory):
+    def __init__(self, text_widget, document=None):
+        super().__init__(document)
+        self.text_widget = text_widget
 
-class NotepadClone:
+    def _apply(self, deltas):
+        self._applying = True
+        try:
+            for delta in deltas:
+                start = self.document.index(delta.offset) if self.document is not None else text_index(delta.offset)
+                end = f"{start}+{tk_length(delta.removed)}c"
+                if delta.removed and delta.inserted:
+                    self.text_widget.replace(start, end, delta.inserted)
+                elif delta.removed:
+                    self.text_widget.delete(start, end)
+                elif delta.inserted:
+                    self.text_widget.insert(start, delta.inserted)
+                self.text_widget.mark_set(tk.INSERT, f"{start}+{tk_length(delta.inserted)}c")
+        finally:
+            self._applying = False
+        self.text_widget.see(tk.INSERT)
+
+
+SEARCH_DEBOUNCE_MS = 150
+SEARCH_TAG_MARGIN_LINES = 200
+
+
+def tag_ranges_batched(text_widget, tag, indices):
+    step = 2 * TAG_BATCH_SIZE
+    for start in range(0, len(indices), step):
+        text_widget.tag_add(tag, *indices[start:start + step])
+
+
+SESSION_INTERVAL_MS = 30000
+TAB_RELEASE_THRESHOLD = 4 << 20
+TAB_LIVE_LIMIT = 8
+
+
+class DocumentTab:
+    def __init__(self, path=None):
+        self.current_file = path
+        self.is_modified = False
+        self.file_format = FileFormat()
+        self.document = PieceTable()
+        self.undo_manager = None
+        self.modification_tracker = ModificationTracker(fetch=self.document.get)
+        self.document_stats = DocumentStats()
+        self.file_loader = None
+        self.large_file_view = None
+        self.pending_goto = None
+        self.text_area = None
+        self.edit_recorder = None
+        # A tab without a text widget is either waiting to be read from
+        # current_file (loaded is False) or holds its text compressed in
+        # stored because it has changes that are not on disk.
+        self.loaded = path is None
+        self.stored = None
+        self.session_buffer = None
+        self.session_generation = None
+        self.large_file = False
+        self.journal_name = None
+        self.journal_bytes = 0
+        self.cursor = "1.0"
+        self.top = 0.0
+        self.last_active = 0.0
+        self.widget = None
+        self.label = None
+
+    @property
+    def title(self):
+        return os.path.basename(self.current_file) if self.current_file else "Untitled"
+
+
+def _tab_attribute(name):
+    return property(
+        lambda self: getattr(self.active_tab, name),
+        lambda self, value: setattr(self.active_tab, name, value)
+    )
+
+
+RECENT_FILES_LIMIT = 200
+
+
+class Command:
+    def __init__(self, command_id, label, callback, shortcut="", sequences=()):
+        self.id = command_id
+        self.label = label
+        self.callback = callback
+        self.shortcut = shortcut
+        self.sequences = sequences
+
+    def invoke(self, event=None):
+        return self.callback()
+
+
+class CommandRegistry:
     def __init__(self):
+        self.commands = {}
+        self.menus = {}
+
+    def add(self, command_id, label, callback, shortcut="", sequences=(), menu=None):
+        command = self.commands[command_id] = Command(command_id, label, callback, shortcut, sequences)
+        if menu is not None:
+            self.menus.setdefault(menu, []).append(command)
+        return command
+
+    def separator(self, menu):
+        self.menus.setdefault(menu, []).append(None)
+
+    def __getitem__(self, command_id):
+        return self.commands[command_id]
+
+    def __iter__(self):
+        return iter(self.commands.values())
+
+
+class UpdateScheduler:
+    def __init__(self, root):
+        self.root = root
+        self._handlers = {}
+        self._dirty = set()
+        self._flush_id = None
+        self._values = {}
+
+    def register(self, part, handler):
+        self._handlers[part] = handler
+
+    def mark(self, *parts):
+        self._dirty.update(parts)
+        if self._flush_id is None:
+            self._flush_id = self.root.after_idle(self.flush)
+
+    def flush(self):
+        if self._flush_id is not None:
+            self.root.after_cancel(self._flush_id)
+            self._flush_id = None
+        dirty, self._dirty = self._dirty, set()
+        for part, handler in self._handlers.items():
+            if part in dirty:
+                handler()
+
+    def configure(self, widget, **options):
+        # Widgets are keyed by their Tk path, which is never reused, and
+        # only options whose value changed are sent to Tk.
+        changed = {}
+        for option, value in options.items():
+            key = (str(widget), option)
+            if self._values.get(key) != value:
+                self._values[key] = value
+                changed[option] = value
+        if changed:
+            widget.configure(**changed)
+
+    def title(self, text):
+        if self._values.get("title") != text:
+            self._values["title"] = text
+            self.root.title(text)
+
+
+STARTUP_BUDGET_MS = 500
+ZOOM_FRAME_MS = 16
+
+
+class StartupProfile:
+    def __init__(self, enabled=False, start=None):
+        self.enabled = enabled
+        self.start = start if start is not None else time.perf_counter()
+        self.last = self.start
+        self.phases = []
+
+    def mark(self, phase):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.phases.append((phase, (now - self.last) * 1000))
+        self.last = now
+
+    def report(self, file=None):
+        if not self.enabled:
+            return
+        file = file or sys.stderr
+        total = (self.last - self.start) * 1000
+        print("Startup profile:", file=file)
+        for phase, elapsed in self.phases:
+            print(f"  {phase:<16}{elapsed:9.1f} ms", file=file)
+        status = "within" if total <= STARTUP_BUDGET_MS else "OVER"
+        print(f"  {'total':<16}{total:9.1f} ms ({status} {STARTUP_BUDGET_MS} ms budget)", file=file)
+
+
+TRACE_CAPACITY = 50000
+TRACE_OVERLAY_MS = 1000
+TRACE_OVERLAY_ROWS = 12
+
+
+def handler_name(func):
+    # after() wraps its callback in a closure named "callit", and key
+    # bindings call Command.invoke; name the function underneath.
+    code = getattr(func, "__code__", None)
+    if code is not None and code.co_name == "callit" and "func" in code.co_freevars:
+        func = func.__closure__[code.co_freevars.index("func")].cell_contents
+        category = "after"
+    else:
+        category = "event"
+    owner = getattr(func, "__self__", None)
+    if isinstance(owner, Command):
+        func = owner.callback
+    return getattr(func, "__qualname__", None) or type(func).__qualname__, category
+
+
+class EventTracer:
+    active = None
+
+    def __init__(self, buffer_size=None, capacity=TRACE_CAPACITY):
+        self.buffer_size = buffer_size or (lambda: 0)
+        self.events = collections.deque(maxlen=capacity)
+        self.origin = time.perf_counter_ns()
+        self._depth = 0
+
+    @property
+    def enabled(self):
+        return EventTracer.active is self
+
+    def enable(self):
+        EventTracer.active = self
+
+    def disable(self):
+        if EventTracer.active is self:
+            EventTracer.active = None
+
+    def record(self, interp, name, category, func, *args):
+        try:
+            commands = interp.call("info", "cmdcount")
+        except tk.TclError:
+            return func(*args)
+        self._depth += 1
+        start = time.perf_counter_ns()
+        try:
+            return func(*args)
+        finally:
+            duration = time.perf_counter_ns() - start
+            self._depth -= 1
+            try:
+                # The second "info cmdcount" counts itself.
+                commands = interp.call("info", "cmdcount") - commands - 1
+            except tk.TclError:
+                commands = 0
+            self.events.append((name, category, start, duration, self._depth, self.buffer_size(), commands))
+
+    def summary(self):
+        durations = {}
+        for name, _category, _start, duration, *_rest in self.events:
+            durations.setdefault(name, []).append(duration)
+        rows = []
+        for name, values in durations.items():
+            values.sort()
+            p50 = values[len(values) // 2]
+            p99 = values[min(len(values) - 1, len(values) * 99 // 100)]
+            rows.append((name, len(values), p50 / 1e6, p99 / 1e6, values[-1] / 1e6))
+        rows.sort(key=lambda row: row[3], reverse=True)
+        return rows
+
+    def chrome_trace(self):
+        pid = os.getpid()
+        events = [
+            {
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": (start - self.origin) / 1000,
+                "dur": duration / 1000,
+                "pid": pid,
+                "tid": 1,
+                "args": {"depth": depth, "buffer": size, "tcl_commands": commands},
+            }
+            for name, category, start, duration, depth, size, commands in self.events
+        ]
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export(self, path):
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.chrome_trace(), file)
+
+
+_OriginalCallWrapperCall = tk.CallWrapper.__call__
+
+
+def _traced_call(wrapper, *args):
+    # Every bind, command and after callback runs through CallWrapper. The
+    # patch is installed at import, since callbacks registered earlier keep
+    # the __call__ they were registered with; untraced it adds one call.
+    tracer = EventTracer.active
+    if tracer is None:
+        return _OriginalCallWrapperCall(wrapper, *args)
+    name, category = handler_name(wrapper.func)
+    return tracer.record(wrapper.widget.tk, name, category, _OriginalCallWrapperCall, wrapper, *args)
+
+
+tk.CallWrapper.__call__ = _traced_call
+
+
+class NotepadClone:
+    text_area = _tab_attribute("text_area")
+    edit_recorder = _tab_attribute("edit_recorder")
+    document = _tab_attribute("document")
+    undo_manager = _tab_attribute("undo_manager")
+    modification_tracker = _tab_attribute("modification_tracker")
+    document_stats = _tab_attribute("document_stats")
+    file_format = _tab_attribute("file_format")
+    current_file = _tab_attribute("current_file")
+    is_modified = _tab_attribute("is_modified")
+    file_loader = _tab_attribute("file_loader")
+    large_file_view = _tab_attribute("large_file_view")
+    pending_goto = _tab_attribute("pending_goto")
+
+    def __init__(self, profile=None, trace=False):
+        self.profile = profile or StartupProfile()
+        self.profile.mark("imports")
         self.root = ctk.CTk()
         self.root.title("Gnotepad")
         self.root.geometry("1000x700")
         
         set_main_app_icon(self.root, "logo.ico")
-        
-        self.root.after(500, lambda: set_main_app_icon(self.root, "logo.ico"))
     
-        self.current_file = None
-        self.is_modified = False
-        self.original_content = ""  
+        self.tabs = []
+        self.active_tab = None
+        
+        self.tracer = EventTracer(self._trace_buffer_size)
+        self.trace_requested = trace
+        self.trace_overlay = None
+        self._trace_overlay_id = None
+        if trace:
+            self.tracer.enable()
         
         self.search_index = "1.0"
-        self.search_matches = []
+        self.search_matches = SearchMatches()
         self.current_match = 0
+        self.search_query = None
+        self.search_engine = SearchEngine()
+        self.search_run = None
+        self._search_tag_id = None
+        self._search_origin = None
+        self._search_request = None
+        self.find_pool = None
+        self.find_workers = os.cpu_count() or 1
+        self.find_search = None
+        self.find_results = []
+        self.find_in_files_folder = None
+        self._find_poll_id = None
+        self._search_debounce_id = None
+        self._search_step_id = None
         
         self.font_family = "Consolas"
         self.font_size = 11
         self.font_style = "normal"
+        self.preview_font = None
+        self.editor_font = tkFont.Font(root=self.root, **self.font_options())
+        self._font_update_id = None
+        self.word_wrap = "none"
+        self.session = SessionStore()
+        self.journal = JournalWriter(os.path.join(self.session.directory, "journal"))
+        self.recent_files = []
+        self._menus = {}
+        self.palette_window = None
+        self._palette_index = None
+        self._palette_query = None
+        self._palette_results = []
+        self.register_commands()
+        self.ui = UpdateScheduler(self.root)
+        self.ui.register("title", self._refresh_title)
+        self.ui.register("status", self._refresh_status)
+        self.ui.register("cursor", self._refresh_cursor_position)
 
         self.setup_ui()
         self.setup_bindings()
-        
-        self.undo_manager = UndoRedoManager(self.text_area)
-        
-        self.text_area.bind("<KeyPress>", self.on_key_press)
-        self.text_area.bind("<Button-1>", self.on_text_change)
+        self.profile.mark("window")
+        
+        self._stats_poll_id = None
+        self._load_feed_id = None
+        self.large_file_threshold = LARGE_FILE_THRESHOLD
+        self.save_worker = SaveWorker()
+        self._save_poll_id = None
+        active = self.restore_session()
+        self.recover_journals()
+        if self.tabs:
+            self.activate_tab(active or self.tabs[0])
+        else:
+            self.add_tab()
+        self._session_id = self.root.after(SESSION_INTERVAL_MS, self._autosave_session)
+        self.profile.mark("session")
         
         self.update_title()
+        self.update_format_labels()
         self.set_windows_taskbar_icon()
+        if self.profile.enabled:
+            self.root.after_idle(self._report_startup)
+
+    def _report_startup(self):
+        self.root.update_idletasks()
+        self.profile.mark("first paint")
+        self.profile.report()
 
     def set_windows_taskbar_icon(self):
 
@@ -227,10 +907,7 @@ class NotepadClone:
             
             if hasattr(self.root, 'tk') and hasattr(self.root.tk(), 'wm_iconphoto'):
                 try:
-                    img = Image.open("logo.ico")
-                    photo = ImageTk.PhotoImage(img)
-                    self.root.tk().wm_iconphoto(True, photo)
-                    self.root._icon = photo
+                    self.root.tk().wm_iconphoto(True, load_photo_image("logo.ico"))
                 except:
                     pass
         except Exception as e:
@@ -274,7 +951,16 @@ class NotepadClone:
             width=150,
             height=30
         )
-        self.search_entry.pack(side="top")
+        self.search_entry.pack(side="left")
+        
+        self.search_count_label = ctk.CTkLabel(
+            self.search_frame,
+            text="",
+            width=80,
+            font=("Arial", 11),
+            text_color="gray60"
+        )
+        self.search_count_label.pack(side="left", padx=(5, 0))
         self.search_entry.bind("<KeyRelease>", self.on_search)
         self.search_entry.bind("<Return>", self.find_next)
         
@@ -301,58 +987,76 @@ class NotepadClone:
         )
         self.redo_btn.pack(side="right", padx=2)
         
+        self.tab_bar = ctk.CTkScrollableFrame(self.root, orientation="horizontal", height=30)
+        self.tab_bar.pack(fill="x", padx=5, pady=(5, 0))
+        
         self.text_frame = ctk.CTkFrame(self.root)
         self.text_frame.pack(fill="both", expand=True, padx=5, pady=5)
         
+        self.v_scrollbar = ctk.CTkScrollbar(self.text_frame, command=self.on_scrollbar_yview)
+        self.h_scrollbar = ctk.CTkScrollbar(self.text_frame, orientation="horizontal")
+        
+        self.v_scrollbar.pack(side="right", fill="y")
+        self.h_scrollbar.pack(side="bottom", fill="x")
+        
 
-        self.text_area = tk.Text(
-            self.text_frame,
-            wrap="none",
-            bg="#212121",
-            fg="#ffffff",
-            insertbackground="#ffffff",
-            selectbackground="#264F78", 
-            selectforeground="#ffffff",
-            font=(self.font_family, self.font_size),
-            undo=False,
-            relief="flat",
-            borderwidth=0,
-            selectborderwidth=0,
-            inactiveselectbackground="#264F78", 
-            highlightthickness=0, 
-            padx=10, 
-            pady=10
-        )
+        self.context_menu = self.build_menu([
+            self.commands["edit.cut"],
+            self.commands["edit.copy"],
+            self.commands["edit.paste"],
+            None,
+            self.commands["edit.select_all"],
+            self.commands["edit.undo"],
+            self.commands["edit.redo"],
+        ])
         
 
-        self.text_area.tag_configure("sel", 
-                                   background="#264F78", 
-                                   foreground="#ffffff",
-                                   borderwidth=0,
-                                   relief="flat")
+
+        self.find_results_frame = ctk.CTkFrame(self.root, height=180)
+        self.find_results_frame.pack_propagate(False)
         
-        self.v_scrollbar = ctk.CTkScrollbar(self.text_frame, command=self.text_area.yview)
-        self.h_scrollbar = ctk.CTkScrollbar(self.text_frame, command=self.text_area.xview, orientation="horizontal")
+        find_results_header = ctk.CTkFrame(self.find_results_frame, fg_color="transparent", height=28)
+        find_results_header.pack(fill="x", side="top")
         
-        self.text_area.configure(yscrollcommand=self.v_scrollbar.set, xscrollcommand=self.h_scrollbar.set)
+        self.find_results_label = ctk.CTkLabel(find_results_header, text="", anchor="w")
+        self.find_results_label.pack(side="left", padx=10)
         
-        self.v_scrollbar.pack(side="right", fill="y")
-        self.h_scrollbar.pack(side="bottom", fill="x")
-        self.text_area.pack(fill="both", expand=True)
+        ctk.CTkButton(
+            find_results_header,
+            text="✕",
+            width=28,
+            height=22,
+            command=self.close_find_results
+        ).pack(side="right", padx=5)
         
-
-        self.context_menu = tk.Menu(self.text_area, tearoff=0, bg="#2b2b2b", fg="white", activebackground="#404040", activeforeground="white", borderwidth=0, relief="flat")
-        self.context_menu.add_command(label="Cut                Ctrl+X", command=self.cut_text)
-        self.context_menu.add_command(label="Copy               Ctrl+C", command=self.copy_text)
-        self.context_menu.add_command(label="Paste              Ctrl+V", command=self.paste_text)
-        self.context_menu.add_separator()
-        self.context_menu.add_command(label="Select All         Ctrl+A", command=self.select_all)
-        self.context_menu.add_command(label="Undo               Ctrl+Z", command=self.undo)
-        self.context_menu.add_command(label="Redo               Ctrl+Y", command=self.redo)
+        self.find_stop_btn = ctk.CTkButton(
+            find_results_header,
+            text="Stop",
+            width=60,
+            height=22,
+            command=self.cancel_find_in_files
+        )
+        self.find_stop_btn.pack(side="right", padx=5)
         
-        self.text_area.bind("<Button-3>", self.show_context_menu)
+        self.find_results_list = tk.Listbox(
+            self.find_results_frame,
+            selectmode="browse",
+            exportselection=0,
+            bg="#212121",
+            fg="white",
+            selectbackground="#1f538d",
+            selectforeground="#ffffff",
+            relief="flat",
+            borderwidth=0,
+            activestyle="none"
+        )
+        find_results_scrollbar = ctk.CTkScrollbar(self.find_results_frame, command=self.find_results_list.yview)
+        find_results_scrollbar.pack(side="right", fill="y")
+        self.find_results_list.configure(yscrollcommand=find_results_scrollbar.set)
+        self.find_results_list.pack(side="left", fill="both", expand=True, padx=(5, 0), pady=(0, 5))
+        self.find_results_list.bind("<ButtonRelease-1>", self.open_find_result)
+        self.find_results_list.bind("<Return>", self.open_find_result)
         
-
         self.status_bar = ctk.CTkFrame(self.root, height=25)
         self.status_bar.pack(fill="x", side="bottom", padx=5, pady=(0, 5))
         self.status_bar.pack_propagate(False)
@@ -362,17 +1066,76 @@ class NotepadClone:
         
         self.cursor_pos_label = ctk.CTkLabel(self.status_bar, text="Ln 1, Col 1")
         self.cursor_pos_label.pack(side="right", padx=10)
+
+        self.newline_label = ctk.CTkLabel(self.status_bar, text="")
+        self.newline_label.pack(side="right", padx=10)
+
+        self.encoding_label = ctk.CTkLabel(self.status_bar, text="")
+        self.encoding_label.pack(side="right", padx=10)
+
+        self.cancel_load_btn = ctk.CTkButton(
+            self.status_bar,
+            text="Cancel",
+            width=60,
+            height=20,
+            command=self.cancel_loading
+        )
+    
+    def register_commands(self):
+        commands = self.commands = CommandRegistry()
+        commands.add("file.new", "New", self.new_file, "Ctrl+N", ("<Control-n>",), "File")
+        commands.add("file.open", "Open...", self.open_file, "Ctrl+O", ("<Control-o>",), "File")
+        commands.add("file.save", "Save", self.save_file, "Ctrl+S", ("<Control-s>",), "File")
+        commands.add("file.save_as", "Save As...", self.save_as_file, "Ctrl+Shift+S", ("<Control-Shift-S>",), "File")
+        commands.add("file.close_tab", "Close Tab", self.close_current_tab, "Ctrl+W", ("<Control-w>",), "File")
+        commands.separator("File")
+        commands.add("file.exit", "Exit", self.exit_app, "Alt+F4", menu="File")
+        commands.add("file.cancel_loading", "Cancel Loading", self.cancel_loading, "Esc", ("<Escape>",))
+        commands.add("tab.next", "Next Tab", self.next_tab, "Ctrl+Tab", ("<Control-Tab>",))
+        commands.add("tab.previous", "Previous Tab", lambda: self.next_tab(-1), "Ctrl+Shift+Tab", ("<Control-Shift-Tab>",))
+        
+        commands.add("edit.undo", "Undo", self.undo, "Ctrl+Z", ("<Control-z>",), "Edit")
+        commands.add("edit.redo", "Redo", self.redo, "Ctrl+Y", ("<Control-y>", "<Control-Shift-Z>"), "Edit")
+        commands.separator("Edit")
+        commands.add("edit.cut", "Cut", self.cut_text, "Ctrl+X", ("<Control-x>",), "Edit")
+        commands.add("edit.copy", "Copy", self.copy_text, "Ctrl+C", ("<Control-c>",), "Edit")
+        commands.add("edit.paste", "Paste", self.paste_text, "Ctrl+V", menu="Edit")
+        commands.add("edit.select_all", "Select All", self.select_all, "Ctrl+A", ("<Control-a>",), "Edit")
+        commands.separator("Edit")
+        commands.add("edit.find", "Find", self.focus_search, "Ctrl+F", ("<Control-f>",), "Edit")
+        commands.add("edit.find_next", "Find Next", self.find_next, "F3", ("<F3>",), "Edit")
+        commands.add("edit.find_previous", "Find Previous", self.find_previous, "Shift+F3", ("<Shift-F3>",), "Edit")
+        commands.add("edit.replace", "Replace", self.show_replace_dialog, "Ctrl+H", ("<Control-h>",), "Edit")
+        commands.add("edit.find_in_files", "Find in Files", self.show_find_in_files_dialog, "Ctrl+Shift+F", ("<Control-Shift-F>",), "Edit")
+        commands.separator("Edit")
+        commands.add("edit.command_palette", "Command Palette", self.show_command_palette, "Ctrl+Shift+P", ("<Control-Shift-P>",), "Edit")
+        
+        commands.add("format.word_wrap", "Word Wrap", self.toggle_word_wrap, menu="Format")
+        commands.add("format.font", "Font...", self.choose_font, menu="Format")
+        
+        commands.add("view.zoom_in", "Zoom In", self.zoom_in, "Ctrl++", ("<Control-plus>", "<Control-equal>"), "View")
+        commands.add("view.zoom_out", "Zoom Out", self.zoom_out, "Ctrl+-", ("<Control-minus>",), "View")
+        commands.add("view.reset_zoom", "Restore Default Zoom", self.reset_zoom, "Ctrl+0", ("<Control-0>",), "View")
+        commands.separator("View")
+        commands.add("view.status_bar", "Status Bar", self.toggle_status_bar, menu="View")
+        commands.separator("View")
+        commands.add("view.performance_overlay", "Performance Overlay", self.toggle_performance_overlay, menu="View")
+        commands.add("view.export_trace", "Export Event Trace...", self.export_trace, menu="View")
+        
+        commands.add("help.support", "Support me", self.open_github_link)
+        commands.add("help.about", "About", self.show_about)
     
     def create_menu_buttons(self):
 
         menu_options = [
-            ("File", self.show_file_menu),
-            ("Edit", self.show_edit_menu),
-            ("Format", self.show_format_menu),
-            ("View", self.show_view_menu),
+            ("File", lambda: self.show_menu("File")),
+            ("Edit", lambda: self.show_menu("Edit")),
+            ("Format", lambda: self.show_menu("Format")),
+            ("View", lambda: self.show_menu("View")),
             ("Support me", self.open_github_link)
         ]
         
+        self.menu_buttons = {}
         for text, command in menu_options:
             btn = ctk.CTkButton(
                 self.left_buttons_frame,
@@ -384,6 +1147,16 @@ class NotepadClone:
                 hover_color="#2b2b2b"
             )
             btn.pack(side="left", padx=2)
+            self.menu_buttons[text] = btn
+    
+    def build_menu(self, commands):
+        menu = tk.Menu(self.root, tearoff=0, bg="#2b2b2b", fg="white", activebackground="#404040", activeforeground="white", borderwidth=0, relief="flat")
+        for command in commands:
+            if command is None:
+                menu.add_separator()
+            else:
+                menu.add_command(label=command.label, accelerator=command.shortcut, command=command.callback)
+        return menu
     
     def show_context_menu(self, event):
 
@@ -392,229 +1165,760 @@ class NotepadClone:
         finally:
             self.context_menu.grab_release()
 
-    def show_file_menu(self):
-        menu = tk.Menu(self.root, tearoff=0, bg="#2b2b2b", fg="white", activebackground="#404040", activeforeground="white", borderwidth=0, relief="flat")
-        menu.add_command(label="New                 Ctrl+N", command=self.new_file)
-        menu.add_command(label="Open...             Ctrl+O", command=self.open_file)
-        menu.add_command(label="Save                Ctrl+S", command=self.save_file)
-        menu.add_command(label="Save As...          Ctrl+Shift+S", command=self.save_as_file)
-        menu.add_separator()
-        menu.add_command(label="Exit                Alt+F4", command=self.exit_app)
-        
-        btn = self.left_buttons_frame.winfo_children()[0]
+    def show_menu(self, name):
+        menu = self._menus.get(name)
+        if menu is None:
+            menu = self._menus[name] = self.build_menu(self.commands.menus[name])
+        
+        btn = self.menu_buttons[name]
         x = btn.winfo_rootx()
         y = btn.winfo_rooty() + btn.winfo_height()
         menu.tk_popup(x, y)
     
-    def show_edit_menu(self):
-        menu = tk.Menu(self.root, tearoff=0, bg="#2b2b2b", fg="white", activebackground="#404040", activeforeground="white", borderwidth=0, relief="flat")
-        menu.add_command(label="Undo                Ctrl+Z", command=self.undo)
-        menu.add_command(label="Redo                Ctrl+Y", command=self.redo)
-        menu.add_command(label="Redo                Ctrl+Shift+Z", command=self.redo)
-        menu.add_separator()
-        menu.add_command(label="Cut                 Ctrl+X", command=self.cut_text)
-        menu.add_command(label="Copy                Ctrl+C", command=self.copy_text)
-        menu.add_command(label="Paste               Ctrl+V", command=self.paste_text)
-        menu.add_command(label="Select All          Ctrl+A", command=self.select_all)
-        menu.add_separator()
-        menu.add_command(label="Find                Ctrl+F", command=self.focus_search)
-        menu.add_command(label="Find Next           F3", command=self.find_next)
-        menu.add_command(label="Replace             Ctrl+H", command=self.show_replace_dialog)
-        
-        btn = self.left_buttons_frame.winfo_children()[1]
-        x = btn.winfo_rootx()
-        y = btn.winfo_rooty() + btn.winfo_height()
-        menu.tk_popup(x, y)
+    def show_command_palette(self):
+        if self.palette_window is None:
+            self.create_command_palette()
+        if self._palette_index is None:
+            self._palette_index = FuzzyIndex(self.palette_entries())
+        
+        self.palette_entry.delete(0, tk.END)
+        self.palette_window.deiconify()
+        self.palette_window.lift()
+        self.palette_entry.focus_set()
+        self.update_command_palette()
     
-    def show_format_menu(self):
-        menu = tk.Menu(self.root, tearoff=0, bg="#2b2b2b", fg="white", activebackground="#404040", activeforeground="white", borderwidth=0, relief="flat")
-        menu.add_command(label="Word Wrap", command=self.toggle_word_wrap)
-        menu.add_command(label="Font...", command=self.choose_font)
+    def create_command_palette(self):
+        palette_window = self.palette_window = tk.Toplevel(self.root)
+        palette_window.title("Command Palette")
+        palette_window.geometry("520x360")
+        palette_window.transient(self.root)
+        palette_window.configure(bg="#2b2b2b")
+        palette_window.protocol("WM_DELETE_WINDOW", self.hide_command_palette)
+        
+        main_frame = ctk.CTkFrame(palette_window)
+        main_frame.pack(fill="both", expand=True, padx=10, pady=10)
         
-        btn = self.left_buttons_frame.winfo_children()[2]
-        x = btn.winfo_rootx()
-        y = btn.winfo_rooty() + btn.winfo_height()
-        menu.tk_popup(x, y)
-    
-    def show_view_menu(self):
-        menu = tk.Menu(self.root, tearoff=0, bg="#2b2b2b", fg="white", activebackground="#404040", activeforeground="white", borderwidth=0, relief="flat")
-        menu.add_command(label="Zoom In             Ctrl++", command=self.zoom_in)
-        menu.add_command(label="Zoom Out            Ctrl+-", command=self.zoom_out)
-        menu.add_command(label="Restore Default Zoom Ctrl+0", command=self.reset_zoom)
-        menu.add_separator()
-        menu.add_command(label="Status Bar", command=self.toggle_status_bar)
+        self.palette_entry = ctk.CTkEntry(main_frame, placeholder_text="Type a command or a recent file...", height=30)
+        self.palette_entry.pack(fill="x", padx=10, pady=(10, 5))
         
-        btn = self.left_buttons_frame.winfo_children()[3]
-        x = btn.winfo_rootx()
-        y = btn.winfo_rooty() + btn.winfo_height()
-        menu.tk_popup(x, y)
+        self.palette_list = tk.Listbox(
+            main_frame,
+            selectmode="browse",
+            exportselection=0,
+            bg="#212121",
+            fg="white",
+            selectbackground="#1f538d",
+            selectforeground="#ffffff",
+            relief="flat",
+            borderwidth=0,
+            activestyle="none"
+        )
+        self.palette_list.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+        
+        self.palette_entry.bind("<KeyRelease>", self.update_command_palette)
+        self.palette_entry.bind("<Down>", lambda e: self.move_palette_selection(1))
+        self.palette_entry.bind("<Up>", lambda e: self.move_palette_selection(-1))
+        self.palette_entry.bind("<Return>", self.run_palette_selection)
+        self.palette_entry.bind("<Escape>", lambda e: self.hide_command_palette())
+        self.palette_list.bind("<Double-Button-1>", self.run_palette_selection)
+        self.palette_list.bind("<Return>", self.run_palette_selection)
+        self.palette_list.bind("<Escape>", lambda e: self.hide_command_palette())
+    
+    def palette_entries(self):
+        entries = []
+        for command in self.commands:
+            if command.id == "edit.command_palette":
+                continue
+            display = f"{command.label}   ({command.shortcut})" if command.shortcut else command.label
+            entries.append((command.label, (display, command.callback)))
+        for path in self.recent_files:
+            name = os.path.basename(path)
+            display = f"Open Recent: {name}   {os.path.dirname(path)}"
+            entries.append((f"Open Recent: {name} {path}", (display, functools.partial(self.open_file, path))))
+        return entries
+    
+    def update_command_palette(self, event=None):
+        query = self.palette_entry.get()
+        if event is not None and query == self._palette_query:
+            return
+        self._palette_query = query
+        self._palette_results = [value for _text, value in self._palette_index.search(query)]
+        self.palette_list.delete(0, tk.END)
+        self.palette_list.insert(tk.END, *(display for display, _action in self._palette_results))
+        if self._palette_results:
+            self.palette_list.selection_set(0)
+    
+    def move_palette_selection(self, step):
+        if not self._palette_results:
+            return "break"
+        selection = self.palette_list.curselection()
+        index = (selection[0] + step) % len(self._palette_results) if selection else 0
+        self.palette_list.selection_clear(0, tk.END)
+        self.palette_list.selection_set(index)
+        self.palette_list.see(index)
+        return "break"
+    
+    def run_palette_selection(self, event=None):
+        selection = self.palette_list.curselection()
+        if not selection:
+            return "break"
+        _display, action = self._palette_results[selection[0]]
+        self.hide_command_palette()
+        action()
+        return "break"
+    
+    def hide_command_palette(self):
+        self.palette_window.withdraw()
+        self._palette_query = None
+        if self.text_area is not None:
+            self.text_area.focus_set()
+    
+    def add_recent_file(self, path):
+        path = os.path.abspath(path)
+        if path in self.recent_files:
+            self.recent_files.remove(path)
+        self.recent_files.insert(0, path)
+        del self.recent_files[RECENT_FILES_LIMIT:]
+        self._palette_index = None
     
     def open_github_link(self):
+        import webbrowser
         webbrowser.open("https://github.com/gevitop/")
 
     def setup_bindings(self):
 
-        self.root.bind("<Control-n>", lambda e: self.new_file())
-        self.root.bind("<Control-o>", lambda e: self.open_file())
-        self.root.bind("<Control-s>", lambda e: self.save_file())
-        self.root.bind("<Control-Shift-S>", lambda e: self.save_as_file())
+        for command in self.commands:
+            for sequence in command.sequences:
+                self.root.bind(sequence, command.invoke)
         
-
-        self.root.bind("<Control-z>", lambda e: self.undo())
-        self.root.bind("<Control-y>", lambda e: self.redo())
-        self.root.bind("<Control-Shift-Z>", lambda e: self.redo())
-        self.root.bind("<Control-x>", lambda e: self.cut_text())
-        self.root.bind("<Control-c>", lambda e: self.copy_text())
-        
-
-        self.text_area.bind("<Control-v>", self.paste_text)
-        self.root.bind("<Control-a>", lambda e: self.select_all())
-        
-
-        self.root.bind("<Control-f>", lambda e: self.focus_search())
-        self.root.bind("<F3>", lambda e: self.find_next())
-        self.root.bind("<Control-h>", lambda e: self.show_replace_dialog())
-        
-
-        self.root.bind("<Control-plus>", lambda e: self.zoom_in())
-        self.root.bind("<Control-equal>", lambda e: self.zoom_in())
-        self.root.bind("<Control-minus>", lambda e: self.zoom_out())
-        self.root.bind("<Control-0>", lambda e: self.reset_zoom())
+        self.root.protocol("WM_DELETE_WINDOW", self.exit_app)
+    
+    def font_options(self):
+        weight = "bold" if "Bold" in self.font_style else "normal"
+        slant = "italic" if "Italic" in self.font_style else "roman"
+        return {"family": self.font_family, "size": self.font_size, "weight": weight, "slant": slant}
+    
+    def create_text_area(self, tab):
+        text_area = tk.Text(
+            self.text_frame,
+            wrap=self.word_wrap,
+            bg="#212121",
+            fg="#ffffff",
+            insertbackground="#ffffff",
+            selectbackground="#264F78", 
+            selectforeground="#ffffff",
+            font=self.editor_font,
+            undo=False,
+            relief="flat",
+            borderwidth=0,
+            selectborderwidth=0,
+            inactiveselectbackground="#264F78", 
+            highlightthickness=0, 
+            padx=10, 
+            pady=10
+        )
         
 
-        self.text_area.bind("<Control-MouseWheel>", self.on_mouse_wheel)
+        text_area.tag_configure("sel", 
+                                background="#264F78", 
+                                foreground="#ffffff",
+                                borderwidth=0,
+                                relief="flat")
+        text_area.tag_config("search_highlight", background="#404040", foreground="#ffff00")
+        text_area.tag_config("current_match", background="#1f538d", foreground="#ffffff")
+        
+        def on_yscroll(first, last):
+            if tab is self.active_tab:
+                self.on_text_yscroll(first, last)
+        
+        def on_xscroll(first, last):
+            if tab is self.active_tab:
+                self.h_scrollbar.set(first, last)
+        
+        def on_edit(delta):
+            if tab is self.active_tab:
+                self.on_text_edit(delta)
+        
+        def on_replace(delta, parts):
+            if tab is self.active_tab:
+                self.on_text_replace(delta, parts)
+        
+        text_area.configure(yscrollcommand=on_yscroll, xscrollcommand=on_xscroll)
+        text_area.bind("<Button-3>", self.show_context_menu)
+        text_area.bind("<Control-v>", self.paste_text)
+        text_area.bind("<Control-MouseWheel>", self.on_mouse_wheel)
+        text_area.bind("<KeyRelease>", self.on_text_change)
+        text_area.bind("<Button-1>", self.on_text_change)
+        text_area.bind("<KeyPress>", self.update_cursor_position)
+        
+        tab.text_area = text_area
+        tab.edit_recorder = TextEditRecorder(text_area, on_edit, tab.document, on_replace)
+        if tab.undo_manager is None:
+            tab.undo_manager = UndoRedoManager(text_area, tab.document)
+        else:
+            tab.undo_manager.text_widget = text_area
+    
+    def add_tab(self, path=None, lazy=False):
+        tab = DocumentTab(path)
+        if not lazy:
+            self.create_text_area(tab)
+        self.tabs.append(tab)
+        
+        tab.widget = ctk.CTkFrame(self.tab_bar, fg_color="transparent")
+        tab.widget.pack(side="left", padx=(0, 2))
+        tab.label = ctk.CTkButton(
+            tab.widget,
+            text=tab.title,
+            width=110,
+            height=24,
+            fg_color="transparent",
+            command=lambda: self.activate_tab(tab)
+        )
+        tab.label.pack(side="left")
+        ctk.CTkButton(
+            tab.widget,
+            text="✕",
+            width=24,
+            height=24,
+            fg_color="transparent",
+            command=lambda: self.close_tab(tab)
+        ).pack(side="left")
+        
+        if not lazy:
+            self.activate_tab(tab)
+        return tab
+    
+    def update_tab_label(self, tab):
+        modified = "*" if tab.is_modified else ""
+        color = "#1f538d" if tab is self.active_tab else "transparent"
+        self.ui.configure(tab.label, text=f"{modified}{tab.title}", fg_color=color)
+    
+    def find_tab(self, path):
+        path = os.path.abspath(path)
+        for tab in self.tabs:
+            if tab.current_file and os.path.abspath(tab.current_file) == path:
+                return tab
+        return None
+    
+    def is_blank_tab(self, tab):
+        return (tab.current_file is None and not tab.is_modified and tab.loaded and tab.stored is None
+                and tab.file_loader is None and tab.large_file_view is None and not len(tab.document))
+    
+    def activate_tab(self, tab):
+        previous = self.active_tab
+        if tab is previous:
+            return
+        if previous is not None:
+            self.reset_search()
+            self._deactivate_tab(previous)
+        
+        self.active_tab = tab
+        if tab.text_area is None:
+            self._restore_tab(tab)
+        tab.text_area.pack(fill="both", expand=True)
+        self.h_scrollbar.configure(command=tab.text_area.xview)
+        if tab.file_loader is not None:
+            self.cancel_load_btn.pack(side="right", padx=10)
+            if self._load_feed_id is None:
+                self._feed_loaded_chunks()
+        else:
+            self.cancel_load_btn.pack_forget()
+        if tab.large_file_view is not None:
+            self._poll_large_file_index()
+        if tab.document_stats.pending and self._stats_poll_id is None:
+            self._stats_poll_id = self.root.after(100, self._poll_document_stats)
+        
+        if previous is not None and previous in self.tabs:
+            self.update_tab_label(previous)
+        self.update_title()
+        self.update_format_labels()
+        self.update_status()
+        self.update_cursor_position()
+        tab.text_area.focus_set()
+        if self.search_entry.get() and tab.large_file_view is None:
+            self.search_text(self.search_entry.get())
+        self._release_inactive_tabs()
+    
+    def _deactivate_tab(self, tab):
+        if self._load_feed_id is not None:
+            self.root.after_cancel(self._load_feed_id)
+            self._load_feed_id = None
+        if tab.text_area is not None:
+            tab.cursor = self.tab_cursor(tab)
+            tab.top = tab.text_area.yview()[0]
+            tab.text_area.pack_forget()
+        tab.last_active = time.monotonic()
+    
+    def tab_cursor(self, tab):
+        index = tab.text_area.index(tk.INSERT)
+        if tab.large_file_view is None:
+            return index
+        # The widget only holds a window of a large file, and the cursor comes
+        # back through goto_position, so keep its line in the whole file and
+        # its column in Python characters.
+        line, _column = tab.large_file_view.global_position(index)
+        return f"{line + 1}.{len(tab.text_area.get(index + ' linestart', index))}"
+    
+    def _restore_tab(self, tab):
+        self.create_text_area(tab)
+        if not tab.loaded and tab.is_modified and tab.session_buffer is not None:
+            try:
+                tab.stored = CompressedText(data=self.session.read_buffer(tab.session_buffer))
+                tab.loaded = True
+            except OSError as e:
+                messagebox.showerror("Error", f"Failed to restore document: {str(e)}")
+                tab.session_buffer = None
+        if tab.stored is not None:
+            text = tab.stored.text()
+            tab.edit_recorder.set_text(text)
+            tab.stored = None
+            # A released tab kept its counts, but text from the session or a
+            # journal has never been counted.
+            stats = tab.document_stats
+            if not stats.pending and not stats.bytes:
+                stats.reset()
+                stats.apply(EditDelta(0, "", text))
+            tab.text_area.mark_set(tk.INSERT, tab.cursor)
+            tab.text_area.yview_moveto(tab.top)
+        elif not tab.loaded:
+            tab.loaded = True
+            line, column = tab.cursor.split(".")
+            if tab.current_file and self.open_path(tab.current_file, True if tab.large_file else None):
+                self.goto_position(int(line), int(column))
+    
+    def _release_inactive_tabs(self):
+        candidates = [
+            tab for tab in self.tabs
+            if tab is not self.active_tab and tab.text_area is not None
+            and tab.file_loader is None and tab.large_file_view is None
+        ]
+        candidates.sort(key=lambda tab: tab.last_active, reverse=True)
+        for rank, tab in enumerate(candidates):
+            if rank >= TAB_LIVE_LIMIT or len(tab.document) > TAB_RELEASE_THRESHOLD:
+                self.release_tab(tab)
+    
+    def release_tab(self, tab):
+        # An unmodified file is simply read again when its tab comes back;
+        # anything else keeps its text compressed, with its undo history.
+        if tab.is_modified or tab.current_file is None:
+            tab.stored = CompressedText(tab.document.pieces())
+        else:
+            tab.loaded = False
+            tab.undo_manager = None
+        tab.edit_recorder.close()
+        tab.text_area.destroy()
+        tab.text_area = None
+        tab.edit_recorder = None
+        tab.document.clear()
+    
+    def close_tab(self, tab):
+        if tab.is_modified:
+            self.activate_tab(tab)
+            if not self.ask_save_changes():
+                return False
         
+        index = self.tabs.index(tab)
+        active = tab is self.active_tab
+        if active:
+            self.reset_search()
+            self._deactivate_tab(tab)
+        if tab.file_loader is not None:
+            tab.file_loader.cancel()
+        if tab.large_file_view is not None:
+            tab.large_file_view.close()
+        if tab.text_area is not None:
+            tab.edit_recorder.close()
+            tab.text_area.destroy()
+        self.discard_journal(tab)
+        tab.widget.destroy()
+        self.tabs.remove(tab)
+        
+        if active:
+            self.active_tab = None
+            if self.tabs:
+                self.activate_tab(self.tabs[min(index, len(self.tabs) - 1)])
+            else:
+                self.add_tab()
+        return True
+    
+    def close_current_tab(self):
+        self.close_tab(self.active_tab)
+    
+    def next_tab(self, step=1):
+        index = self.tabs.index(self.active_tab)
+        self.activate_tab(self.tabs[(index + step) % len(self.tabs)])
+        return "break"
+    
+    def on_scrollbar_yview(self, *args):
+        if self.large_file_view is not None:
+            self.large_file_view.yview(*args)
+        else:
+            self.text_area.yview(*args)
 
-        self.text_area.bind("<KeyRelease>", self.on_text_change)
-        self.text_area.bind("<Button-1>", self.update_cursor_position)
-        self.text_area.bind("<KeyPress>", self.update_cursor_position)
-        
+    def on_text_yscroll(self, first, last):
+        if self.large_file_view is not None:
+            self.large_file_view.on_yscroll(first, last)
+        else:
+            self.v_scrollbar.set(first, last)
+            if self.search_matches:
+                self.schedule_search_tags()
 
-        self.root.protocol("WM_DELETE_WINDOW", self.exit_app)
-    
     def on_mouse_wheel(self, event):
 
         if event.delta > 0:
             self.zoom_in()
         else:
             self.zoom_out()
+        return "break"
     
-    def on_key_press(self, event):
+    def on_text_edit(self, delta):
 
-        if event.keysym in ['Return', 'BackSpace', 'Delete', 'Tab']:
-            self.undo_manager.save_state()
-        elif event.char and event.char.isprintable():
+        if self.file_loader is not None or self.large_file_view is not None:
+            return
+        self.undo_manager.record(delta)
+        self.set_modified(self.modification_tracker.record(delta))
+        self.journal_edit(self.active_tab, delta)
+        if self.search_run is not None and self.search_run.done and self.search_query is not None:
+            self.update_search_matches(delta)
+        self.count_edit(delta)
+
+    def on_text_replace(self, delta, parts):
+        # Undo keeps every replaced span, but the rest of the bookkeeping
+        # treats Replace All as one edit of the range it covers, and an
+        # active search is run again rather than updated span by span.
+        if self.file_loader is not None or self.large_file_view is not None:
+            return
+        for part in parts:
+            self.undo_manager.record(part)
+        self.set_modified(self.modification_tracker.record(delta))
+        if self.is_modified:
+            self.checkpoint_journal(self.active_tab, self.document.pieces())
+        else:
+            self.discard_journal(self.active_tab)
+        query = self.search_query
+        if self.search_run is not None and query is not None:
+            self.search_text(query.text, query.match_case, query.whole_word, query.regex)
+        self.count_edit(delta)
+
+    def count_edit(self, delta):
+        end = delta.offset + len(delta.inserted)
+        before = self.document.get(delta.offset - 1, delta.offset)
+        after = self.document.get(end, end + 1)
+        self.document_stats.apply(delta, before, after)
+        if self.document_stats.pending and self._stats_poll_id is None:
+            self._stats_poll_id = self.root.after(100, self._poll_document_stats)
+
+    def _poll_document_stats(self):
+        self._stats_poll_id = None
+        if not self.document_stats.collect():
+            self._stats_poll_id = self.root.after(100, self._poll_document_stats)
+        self.update_status()
 
-            if len(self.text_area.get("1.0", "end-1c")) % 10 == 0:
-                self.undo_manager.save_state()
-    
     def on_text_change(self, event=None):
-        current_text = self.text_area.get("1.0", "end-1c")
-        
-        if self.current_file is None:
-            self.is_modified = (current_text != "")
-        else:
-            self.is_modified = (current_text != self.original_content)
-            
-        self.update_title()
         self.update_status()
         self.update_cursor_position()
     
     def update_cursor_position(self, event=None):
-        self.root.after(1, self._update_cursor_pos)
+        self.ui.mark("cursor")
     
-    def _update_cursor_pos(self):
+    def _refresh_cursor_position(self):
+        if self.active_tab is None or self.text_area is None:
+            return
         cursor_pos = self.text_area.index(tk.INSERT)
         line, col = cursor_pos.split('.')
-        self.cursor_pos_label.configure(text=f"Ln {line}, Col {int(col) + 1}")
+        if self.large_file_view is not None:
+            line = self.large_file_view.global_position(cursor_pos)[0] + 1
+        self.ui.configure(self.cursor_pos_label, text=f"Ln {line}, Col {int(col) + 1}")
     
+    def set_modified(self, modified):
+        if modified != self.is_modified:
+            self.is_modified = modified
+            self.update_title()
+
     def update_title(self):
+        self.ui.mark("title")
+    
+    def _refresh_title(self):
+        if self.active_tab is None:
+            return
         filename = os.path.basename(self.current_file) if self.current_file else "Untitled"
         modified = "*" if self.is_modified else ""
-        self.root.title(f"{modified}{filename} - Gnotepad")
+        read_only = " [Read-only]" if self.large_file_view is not None else ""
+        self.ui.title(f"{modified}{filename}{read_only} - Gnotepad")
+        self.update_tab_label(self.active_tab)
     
+    def update_format_labels(self):
+        self.ui.configure(self.encoding_label, text=self.file_format.encoding_label)
+        self.ui.configure(self.newline_label, text=self.file_format.newline_label)
+
     def update_status(self):
-        char_count = len(self.text_area.get("1.0", "end-1c"))
-        self.status_label.configure(text=f"Characters: {char_count}")
+        self.ui.mark("status")
+    
+    def set_status(self, text):
+        self.ui.configure(self.status_label, text=text)
+    
+    def _refresh_status(self):
+        if self.active_tab is None or self.file_loader is not None:
+            return
+        if self.large_file_view is not None:
+            document = self.large_file_view.document
+            lines = f"{document.line_count:,}" if document.indexed else f"Indexing {document.index_progress:.0%}..."
+            self.set_status(f"Large file mode   Lines: {lines}   Size: {format_size(document.size)}")
+            return
+        stats = self.document_stats
+        if stats.pending:
+            self.set_status("Counting...")
+            return
+        self.set_status(
+            f"Characters: {stats.characters:,}   Words: {stats.words:,}   "
+            f"Lines: {stats.lines:,}   Size: {format_size(stats.bytes)}"
+        )
     
 
     def new_file(self):
-        if self.is_modified:
-            if not self.ask_save_changes():
-                return
+        self.add_tab()
+    
+    def open_file(self, file_path=None):
+        if file_path is None:
+            file_path = filedialog.askopenfilename(
+                defaultextension=".txt",
+                filetypes=[("Text files", "*.txt"), ("All files", "*.*")]
+            )
+        if not file_path:
+            return
         
-        self.text_area.delete("1.0", tk.END)
-        self.current_file = None
+        tab = self.find_tab(file_path)
+        if tab is not None:
+            self.add_recent_file(file_path)
+            self.activate_tab(tab)
+            return
+        previous = self.active_tab
+        created = not self.is_blank_tab(previous)
+        if created:
+            self.add_tab()
+        if self.open_path(file_path):
+            self.add_recent_file(file_path)
+        elif created:
+            self.close_tab(self.active_tab)
+            self.activate_tab(previous)
+    
+    def open_path(self, file_path, use_large_file_mode=None):
+        try:
+            size = os.path.getsize(file_path)
+            file_format = detect_file_format(file_path)
+        except OSError as e:
+            messagebox.showerror("Error", f"Failed to open file: {str(e)}")
+            return False
+        if size > self.large_file_threshold and file_format.encoding in ASCII_COMPATIBLE_ENCODINGS:
+            if use_large_file_mode is None:
+                use_large_file_mode = messagebox.askyesnocancel(
+                    "Large File",
+                    f"{os.path.basename(file_path)} is {format_size(size)}.\n"
+                    "Open it read-only in large file mode?"
+                )
+            if use_large_file_mode is None:
+                return False
+            if use_large_file_mode:
+                return self.open_large_file(file_path, file_format)
+        return self.load_file(file_path, file_format)
+
+    def open_large_file(self, file_path, file_format):
+        try:
+            document = LargeFileDocument(file_path, file_format.encoding, file_format.bom)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Error", f"Failed to open file: {str(e)}")
+            return False
+
+        self.stop_loading()
+        self.close_large_file()
+        self.reset_search()
+        self.document_stats.reset()
+        self.current_file = file_path
+        self.file_format = file_format
+        self.large_file_view = LargeFileView(document, self.text_area, self.edit_recorder, self.v_scrollbar)
+        self.text_area.mark_set(tk.INSERT, "1.0")
+        self.undo_manager = UndoRedoManager(self.text_area, self.document)
+        self.modification_tracker.mark_saved()
         self.is_modified = False
-        self.original_content = ""
-        self.undo_manager = UndoRedoManager(self.text_area)
+        self.discard_journal(self.active_tab)
         self.update_title()
+        self.update_format_labels()
+        self._poll_large_file_index()
+        return True
+
+    def _poll_large_file_index(self):
+        view = self.large_file_view
+        if view is None:
+            return
         self.update_status()
-    
-    def open_file(self):
-        if self.is_modified:
-            if not self.ask_save_changes():
-                return
-        
-        file_path = filedialog.askopenfilename(
-            defaultextension=".txt",
-            filetypes=[("Text files", "*.txt"), ("All files", "*.*")]
-        )
-        
-        if file_path:
+        if not view.document.indexed:
+            self.root.after(250, self._poll_large_file_index)
+
+    def close_large_file(self):
+        if self.large_file_view is not None:
+            self.large_file_view.close()
+            self.large_file_view = None
+            self.text_area.configure(state="normal")
+            self.edit_recorder.clear()
+
+    def load_file(self, file_path, file_format=None):
+        self.stop_loading()
+        self.pending_goto = None
+        try:
+            loader = FileLoader(file_path, file_format)
+        except OSError as e:
+            messagebox.showerror("Error", f"Failed to open file: {str(e)}")
+            return False
+
+        self.close_large_file()
+        self.reset_search()
+        self.edit_recorder.clear()
+        self.document_stats.reset()
+        self.file_loader = loader
+        self.current_file = file_path
+        self.is_modified = False
+        self.text_area.configure(state="disabled")
+        self.cancel_load_btn.pack(side="right", padx=10)
+        self.update_title()
+        self._feed_loaded_chunks()
+        return True
+
+    def _feed_loaded_chunks(self):
+        self._load_feed_id = None
+        loader = self.file_loader
+        if loader is None:
+            return
+        finished = loader.done
+        batch = []
+        batch_size = 0
+        while batch_size < LOAD_BATCH_SIZE:
             try:
-                with open(file_path, 'r', encoding='utf-8') as file:
-                    content = file.read()
-                
-                self.text_area.delete("1.0", tk.END)
-                self.text_area.insert("1.0", content)
-                self.current_file = file_path
-                self.original_content = content
-                self.is_modified = False
-                self.undo_manager = UndoRedoManager(self.text_area)
-                self.undo_manager.current_text = content
-                self.update_title()
-                self.update_status()
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to open file: {str(e)}")
+                text, counts = loader.chunks.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(text)
+            batch_size += len(text)
+            self.document_stats.add_counts(counts)
+
+        if batch:
+            first_batch = self.edit_recorder.length == 0
+            self.text_area.configure(state="normal")
+            self.text_area.insert("end-1c", "".join(batch))
+            self.text_area.configure(state="disabled")
+            if first_batch:
+                self.text_area.mark_set(tk.INSERT, "1.0")
+
+        if loader.error is not None:
+            self.stop_loading()
+            self.edit_recorder.clear()
+            self.document_stats.reset()
+            self.current_file = None
+            self.file_format = FileFormat()
+            self.modification_tracker.mark_saved()
+            self.update_title()
+            self.update_format_labels()
+            self.update_status()
+            messagebox.showerror("Error", f"Failed to open file: {str(loader.error)}")
+        elif finished and loader.chunks.empty():
+            self._finish_loading()
+            self.modification_tracker.mark_saved()
+            self.update_title()
+            self.update_status()
+            if self.pending_goto is not None:
+                self.goto_position(*self.pending_goto)
+        else:
+            name = os.path.basename(loader.path)
+            self.set_status(f"Loading {name}... {loader.progress:.0%}")
+            self._load_feed_id = self.root.after(1 if batch else 20, self._feed_loaded_chunks)
+
+    def _finish_loading(self):
+        self.file_format = self.file_loader.file_format
+        self.update_format_labels()
+        self.file_loader = None
+        self.text_area.configure(state="normal")
+        self.cancel_load_btn.pack_forget()
+        self.undo_manager = UndoRedoManager(self.text_area, self.document)
+        self.is_modified = False
+
+    def stop_loading(self):
+        if self.file_loader is not None:
+            self.file_loader.cancel()
+            self._finish_loading()
+
+    def cancel_loading(self):
+        if self.file_loader is None:
+            return
+        self.stop_loading()
+        self.current_file = None
+        self.modification_tracker.mark_unsaved()
+        self.is_modified = True
+        self.set_status("Loading cancelled")
+        self.update_title()
     
     def save_file(self):
+        if self.file_loader is not None or self.large_file_view is not None:
+            return
         if self.current_file:
-            try:
-                content = self.text_area.get("1.0", "end-1c")
-                with open(self.current_file, 'w', encoding='utf-8') as file:
-                    file.write(content)
-                self.is_modified = False
-                self.original_content = content
-                self.update_title()
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to save file: {str(e)}")
+            self.submit_save(self.current_file)
         else:
             self.save_as_file()
     
     def save_as_file(self):
+        if self.file_loader is not None or self.large_file_view is not None:
+            return
         file_path = filedialog.asksaveasfilename(
             defaultextension=".txt",
             filetypes=[("Text files", "*.txt"), ("All files", "*.*")]
         )
         
         if file_path:
+            self.submit_save(file_path, adopt_path=True)
+
+    def submit_save(self, file_path, adopt_path=False):
+        content = self.document.pieces()
+        self.save_worker.submit(SaveJob(file_path, content, self.modification_tracker.generation, self.file_format, adopt_path, self.active_tab))
+        self.set_status(f"Saving {os.path.basename(file_path)}...")
+        if self._save_poll_id is None:
+            self._save_poll_id = self.root.after(20, self._poll_saves)
+
+    def _poll_saves(self):
+        self._save_poll_id = None
+        self.collect_saves()
+        if self.save_worker.busy:
+            self._save_poll_id = self.root.after(20, self._poll_saves)
+
+    def collect_saves(self):
+        while True:
             try:
-                content = self.text_area.get("1.0", "end-1c")
-                with open(file_path, 'w', encoding='utf-8') as file:
-                    file.write(content)
-                self.current_file = file_path
-                self.is_modified = False
-                self.original_content = content
-                self.update_title()
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to save file: {str(e)}")
+                job, error = self.save_worker.results.get_nowait()
+            except queue.Empty:
+                break
+            if error is not None:
+                messagebox.showerror("Error", f"Failed to save file: {str(error)}")
+                continue
+            tab = job.tab
+            if job.adopt_path:
+                tab.current_file = job.path
+            if job.path == tab.current_file:
+                tab.modification_tracker.mark_saved_at(job.generation)
+                tab.is_modified = tab.modification_tracker.modified
+                if not tab.is_modified:
+                    self.discard_journal(tab)
+            if tab in self.tabs:
+                self.update_tab_label(tab)
+            self.update_title()
+        self.update_status()
+
+    def wait_for_saves(self):
+        self.save_worker.wait()
+        self.collect_saves()
     
     def ask_save_changes(self):
         if self.is_modified:
             response = messagebox.askyesnocancel("Save Changes", "Do you want to save changes to this document?")
             if response is True:
                 self.save_file()
+                self.wait_for_saves()
                 return not self.is_modified
             elif response is False:
                 return True
@@ -652,7 +1956,7 @@ class NotepadClone:
             self.root.clipboard_append(selected_text)
         except tk.TclError:
 
-            full_text = self.text_area.get("1.0", "end-1c")
+            full_text = self.document.text()
             self.root.clipboard_clear()
             self.root.clipboard_append(full_text)
     
@@ -667,11 +1971,10 @@ class NotepadClone:
             pass
     
     def select_all(self):
-        content = self.text_area.get("1.0", "end-1c")
         self.text_area.tag_remove("sel", "1.0", "end")
         
 
-        self.text_area.tag_add("sel", "1.0", f"1.0+{len(content)}c")
+        self.text_area.tag_add("sel", "1.0", "end-1c")
         self.text_area.focus_set()
     
 
@@ -681,80 +1984,210 @@ class NotepadClone:
     
     def on_search(self, event=None):
         query = self.search_entry.get()
+        if self.large_file_view is not None:
+            return
+        if query == self._search_request:
+            return
+        
+        self._search_request = query
+        self.cancel_search()
         if not query:
+            self.search_query = None
             self.clear_search_highlights()
+            self.update_search_count()
             return
         
-        self.search_text(query)
+        self._search_debounce_id = self.root.after(SEARCH_DEBOUNCE_MS, self.search_text, query)
     
-    def search_text(self, query):
+    def search_text(self, query, match_case=False, whole_word=False, regex=False):
+        self.cancel_search()
+        self._search_request = query
+        previous = self.search_run
+        if previous is None or previous.generation != self.modification_tracker.generation:
+            previous = None
         self.clear_search_highlights()
         
         if not query:
+            self.search_query = None
+            self.update_search_count()
             return
         
-        self.search_matches = []
-        start = "1.0"
-        
-        while True:
-            pos = self.text_area.search(query, start, tk.END, nocase=True)
-            if not pos:
-                break
-            
-            end = f"{pos}+{len(query)}c"
-            self.search_matches.append((pos, end))
-            self.text_area.tag_add("search_highlight", pos, end)
-            start = end
-        
+        self.search_query = SearchQuery(query, match_case, whole_word, regex)
+        content = previous.text if previous is not None else self.document.text()
+        try:
+            run = SearchRun(self.search_engine, content, self.search_query, previous)
+        except re.error as e:
+            self.search_run = None
+            self.set_status(f"Invalid regular expression: {e}")
+            self.update_search_count()
+            return
 
-        self.text_area.tag_config("search_highlight", background="#404040", foreground="#ffff00")
+        run.generation = self.modification_tracker.generation
+        self.search_run = run
+        self._search_origin = self.document.offset_of_index(self.text_area.index(tk.INSERT))
+        self._step_search()
+    
+    def _step_search(self):
+        self._search_step_id = None
+        run = self.search_run
+        if run.generation != self.modification_tracker.generation:
+            query = self.search_query
+            self.search_run = None
+            self.search_text(query.text, query.match_case, query.whole_word, query.regex)
+            return
         
-        if self.search_matches:
+        spans = run.step()
+        if spans:
+            self.search_matches.extend(spans)
+            if self._search_origin is not None and self.search_matches[-1][0] >= self._search_origin:
+                self.current_match = self.search_matches.bisect(self._search_origin)
+                self._search_origin = None
+                self.highlight_current_match()
+            else:
+                self.schedule_search_tags()
+        if run.done and self._search_origin is not None and self.search_matches:
+            self._search_origin = None
             self.current_match = 0
             self.highlight_current_match()
+        
+        self.update_search_count()
+        if not run.done:
+            self._search_step_id = self.root.after(1, self._step_search)
+    
+    def cancel_search(self):
+        if self._search_debounce_id is not None:
+            self.root.after_cancel(self._search_debounce_id)
+            self._search_debounce_id = None
+        if self._search_step_id is not None:
+            self.root.after_cancel(self._search_step_id)
+            self._search_step_id = None
+    
+    def reset_search(self):
+        self.cancel_search()
+        self.clear_search_highlights()
+        self.search_run = None
+        self._search_request = None
+        self.update_search_count()
+    
+    def update_search_count(self):
+        run = self.search_run
+        if run is None or not self.search_entry.get():
+            text = ""
+        elif not self.search_matches:
+            text = "No results" if run.done else "..."
+        else:
+            total = f"{len(self.search_matches):,}" + ("" if run.done else "+")
+            text = f"{self.current_match + 1:,} of {total}"
+        self.ui.configure(self.search_count_label, text=text)
+    
+    def update_search_matches(self, delta):
+        matches = self.search_matches
+        update_matches(self.search_engine, matches, self.document, self.search_query, delta)
+        self.current_match = max(0, min(self.current_match, len(matches) - 1))
+        self.schedule_search_tags()
+        self.update_search_count()
     
     def find_next(self, event=None):
+        if self.large_file_view is not None:
+            self.find_in_large_file(self.search_entry.get())
+            return
         if not self.search_matches:
             return
         
-        self.current_match = (self.current_match + 1) % len(self.search_matches)
+        position = self.document.offset_of_index(self.text_area.index(tk.INSERT))
+        self.current_match = self.search_matches.bisect(position + 1) % len(self.search_matches)
         self.highlight_current_match()
     
+    def find_previous(self, event=None):
+        if self.large_file_view is not None or not self.search_matches:
+            return
+        
+        position = self.document.offset_of_index(self.text_area.index(tk.INSERT))
+        self.current_match = (self.search_matches.bisect(position) - 1) % len(self.search_matches)
+        self.highlight_current_match()
+    
+    def find_in_large_file(self, query):
+        if not query:
+            return
+        document = self.large_file_view.document
+        needle = query.encode(document.encoding, errors="replace")
+        pattern = re.compile(re.escape(needle), re.IGNORECASE)
+        self.large_file_view.find_next(pattern, len(needle) - 1, self._show_large_search_status)
+
+    def _show_large_search_status(self, message):
+        if message is None:
+            self.update_status()
+        else:
+            self.set_status(message)
+
     def highlight_current_match(self):
         if not self.search_matches:
             return
         
-
+        start, end = self.search_matches[self.current_match]
+        first = self.document.index(start)
+        self.text_area.tag_remove("sel", "1.0", tk.END)
+        self.text_area.tag_add("sel", first, self.document.index(end))
+        self.text_area.mark_set(tk.INSERT, first)
+        self.text_area.see(tk.INSERT)
+        self.schedule_search_tags()
+        self.update_search_count()
+    
+    def schedule_search_tags(self):
+        if self._search_tag_id is None:
+            self._search_tag_id = self.root.after_idle(self.refresh_search_tags)
+    
+    def refresh_search_tags(self):
+        self._search_tag_id = None
+        self.text_area.tag_remove("search_highlight", "1.0", tk.END)
         self.text_area.tag_remove("current_match", "1.0", tk.END)
+        matches = self.search_matches
+        if not matches or self.large_file_view is not None:
+            return
         
-
-        pos, end = self.search_matches[self.current_match]
-        self.text_area.tag_add("current_match", pos, end)
-        self.text_area.tag_config("current_match", background="#1f538d", foreground="#ffffff")
+        # Only the lines around the viewport carry tags; Tk has to maintain
+        # every tagged range on each edit and redraw.
+        top = int(self.text_area.index("@0,0").split(".")[0])
+        bottom = int(self.text_area.index(f"@0,{self.text_area.winfo_height()}").split(".")[0])
+        first_line = max(1, top - SEARCH_TAG_MARGIN_LINES)
+        low = self.document.line_start(first_line - 1)
+        high = self.document.line_start(bottom + SEARCH_TAG_MARGIN_LINES)
+        window = self.document.get(low, high)
+        first, last = matches.between(low, high)
+        if first == last:
+            return
         
-
-        self.text_area.see(pos)
+        starts, ends = matches.spans(first, last)
+        offsets = [0] * (2 * (last - first))
+        offsets[0::2] = [start - low for start in starts]
+        offsets[1::2] = [min(end, high) - low for end in ends]
+        indices = IndexConverter(window, first_line).convert(offsets)
+        tag_ranges_batched(self.text_area, "search_highlight", indices)
+        if first <= self.current_match < last:
+            position = 2 * (self.current_match - first)
+            self.text_area.tag_add("current_match", indices[position], indices[position + 1])
     
     def clear_search_highlights(self):
+        if self._search_tag_id is not None:
+            self.root.after_cancel(self._search_tag_id)
+            self._search_tag_id = None
         self.text_area.tag_remove("search_highlight", "1.0", tk.END)
         self.text_area.tag_remove("current_match", "1.0", tk.END)
-        self.search_matches = []
+        self.search_matches.clear()
         self.current_match = 0
 
 
     def show_replace_dialog(self):
         replace_window = tk.Toplevel(self.root)
         replace_window.title("Replace")
-        replace_window.geometry("650x280")
+        replace_window.geometry("650x370")
         replace_window.transient(self.root)
         replace_window.grab_set()
         replace_window.configure(bg="#2b2b2b")
         replace_window.iconbitmap('')
 
         try:
-            img = Image.open("logo.ico")
-            photo = ImageTk.PhotoImage(img)
-            replace_window.iconphoto(False, photo)
+            replace_window.iconphoto(False, load_photo_image("logo.ico"))
         except:
             pass
 
@@ -777,47 +2210,101 @@ class NotepadClone:
         options_frame.grid(row=2, column=0, columnspan=2, sticky="w", padx=10, pady=10)
         
         match_case = tk.BooleanVar()
+        whole_word = tk.BooleanVar()
+        use_regex = tk.BooleanVar()
         wrap_around = tk.BooleanVar(value=True)
         
         ctk.CTkCheckBox(options_frame, text="Match case", variable=match_case).pack(anchor="w")
+        ctk.CTkCheckBox(options_frame, text="Match whole word only", variable=whole_word).pack(anchor="w")
+        ctk.CTkCheckBox(options_frame, text="Regular expression", variable=use_regex).pack(anchor="w")
         ctk.CTkCheckBox(options_frame, text="Wrap around", variable=wrap_around).pack(anchor="w")
         
 
         button_frame = ctk.CTkFrame(main_frame, fg_color="transparent")
         button_frame.grid(row=3, column=0, columnspan=2, pady=10)
         
+        result_label = ctk.CTkLabel(main_frame, text="")
+        result_label.grid(row=4, column=0, columnspan=2, sticky="w", padx=10)
+        
         def find_next_action():
             find_text = find_entry.get()
             if find_text:
                 self.search_entry.delete(0, tk.END)
                 self.search_entry.insert(0, find_text)
-                self.search_text(find_text)
-                self.find_next()
+                query = SearchQuery(find_text, match_case.get(), whole_word.get(), use_regex.get())
+                if query == self.search_query and self.search_run is not None:
+                    self.find_next()
+                else:
+                    self.search_text(find_text, query.match_case, query.whole_word, query.regex)
         
         def replace_action():
             find_text = find_entry.get()
-            replace_text = replace_entry.get()
-            if find_text and self.search_matches:
-                selected_text = self.text_area.get("sel.first", "sel.last")
-                if selected_text == find_text:
-                    self.text_area.delete("sel.first", "sel.last")
-                    self.text_area.insert("sel.first", replace_text)
+            if not find_text:
+                return
+            if self.file_loader is not None or self.large_file_view is not None:
+                result_label.configure(text="The document cannot be changed right now")
+                return
+            
+            # Only the current match is replaced, and only while it is still
+            # selected; otherwise Replace just moves to the next match.
+            query = SearchQuery(find_text, match_case.get(), whole_word.get(), use_regex.get())
+            if query != self.search_query or not self.search_matches or not self.text_area.tag_ranges("sel"):
+                find_next_action()
+                return
+            start, end = self.search_matches[self.current_match]
+            first, last = self.document.index(start), self.document.index(end)
+            if self.text_area.index("sel.first") != first or self.text_area.index("sel.last") != last:
                 find_next_action()
+                return
+            
+            replace_text = replace_entry.get()
+            if query.regex:
+                # Expand group references against the lines the match is on,
+                # which is as far as the search re-checks a regex after edits.
+                document = self.document
+                low = document.line_start(document.line_of(start))
+                line = document.line_of(end) + 1
+                high = document.line_start(line) - (1 if line < document.line_count else 0)
+                match = query.compile().match(document.get(low, high), start - low)
+                if match is None or match.end() != end - low:
+                    find_next_action()
+                    return
+                try:
+                    replace_text = match.expand(replace_text)
+                except re.error as e:
+                    messagebox.showerror("Replace", f"Invalid replacement: {e}", parent=replace_window)
+                    return
+            
+            self.text_area.replace(first, last, replace_text)
+            self.on_text_change()
+            if self.search_matches:
+                self.current_match = self.search_matches.bisect(start + len(replace_text)) % len(self.search_matches)
+                self.highlight_current_match()
         
         def replace_all_action():
             find_text = find_entry.get()
             replace_text = replace_entry.get()
-            if find_text:
-                content = self.text_area.get("1.0", "end-1c")
-                if match_case.get():
-                    new_content = content.replace(find_text, replace_text)
-                else:
-                    pattern = re.compile(re.escape(find_text), re.IGNORECASE)
-                    new_content = pattern.sub(replace_text, content)
-                
-                self.text_area.delete("1.0", tk.END)
-                self.text_area.insert("1.0", new_content)
-                self.on_text_change()
+            if not find_text:
+                return
+            if self.file_loader is not None or self.large_file_view is not None:
+                result_label.configure(text="The document cannot be changed right now")
+                return
+            
+            query = SearchQuery(find_text, match_case.get(), whole_word.get(), use_regex.get())
+            content = self.document.text()
+            try:
+                spans, texts = replacements(self.search_engine, content, query, replace_text)
+            except re.error as e:
+                messagebox.showerror("Replace", f"Invalid regular expression: {e}", parent=replace_window)
+                return
+            
+            self.undo_manager.begin_group()
+            try:
+                self.edit_recorder.replace_spans(content, spans, texts)
+            finally:
+                self.undo_manager.end_group()
+            self.on_text_change()
+            result_label.configure(text=f"Replaced {len(spans):,} occurrence{'' if len(spans) == 1 else 's'}")
         
         ctk.CTkButton(button_frame, text="Find Next", command=find_next_action, width=100).pack(side="left", padx=5)
         ctk.CTkButton(button_frame, text="Replace", command=replace_action, width=100).pack(side="left", padx=5)
@@ -830,10 +2317,207 @@ class NotepadClone:
         find_entry.focus_set()
     
 
+    def show_find_in_files_dialog(self):
+        find_window = tk.Toplevel(self.root)
+        find_window.title("Find in Files")
+        find_window.geometry("650x340")
+        find_window.transient(self.root)
+        find_window.grab_set()
+        find_window.configure(bg="#2b2b2b")
+        find_window.iconbitmap('')
+
+        try:
+            find_window.iconphoto(False, load_photo_image("logo.ico"))
+        except:
+            pass
+
+
+        main_frame = ctk.CTkFrame(find_window)
+        main_frame.pack(fill="both", expand=True, padx=10, pady=10)
+        
+
+        ctk.CTkLabel(main_frame, text="Find what:").grid(row=0, column=0, sticky="w", padx=10, pady=(10, 5))
+        find_entry = ctk.CTkEntry(main_frame, width=300)
+        find_entry.grid(row=0, column=1, columnspan=2, padx=10, pady=(10, 5), sticky="ew")
+        find_entry.insert(0, self.search_entry.get())
+        
+
+        ctk.CTkLabel(main_frame, text="Folder:").grid(row=1, column=0, sticky="w", padx=10, pady=5)
+        folder_entry = ctk.CTkEntry(main_frame, width=300)
+        folder_entry.grid(row=1, column=1, padx=10, pady=5, sticky="ew")
+        folder_entry.insert(0, self.find_in_files_folder or (os.path.dirname(self.current_file) if self.current_file else os.getcwd()))
+        
+        def browse_folder():
+            folder = filedialog.askdirectory(initialdir=folder_entry.get() or None, parent=find_window)
+            if folder:
+                folder_entry.delete(0, tk.END)
+                folder_entry.insert(0, folder)
+        
+        ctk.CTkButton(main_frame, text="Browse...", command=browse_folder, width=80).grid(row=1, column=2, padx=(0, 10), pady=5)
+        
+
+        ctk.CTkLabel(main_frame, text="Files:").grid(row=2, column=0, sticky="w", padx=10, pady=5)
+        patterns_entry = ctk.CTkEntry(main_frame, width=300)
+        patterns_entry.grid(row=2, column=1, columnspan=2, padx=10, pady=5, sticky="ew")
+        patterns_entry.insert(0, "*")
+        
+
+        options_frame = ctk.CTkFrame(main_frame, fg_color="transparent")
+        options_frame.grid(row=3, column=0, columnspan=3, sticky="w", padx=10, pady=10)
+        
+        match_case = tk.BooleanVar()
+        whole_word = tk.BooleanVar()
+        use_regex = tk.BooleanVar()
+        
+        ctk.CTkCheckBox(options_frame, text="Match case", variable=match_case).pack(anchor="w")
+        ctk.CTkCheckBox(options_frame, text="Match whole word only", variable=whole_word).pack(anchor="w")
+        ctk.CTkCheckBox(options_frame, text="Regular expression", variable=use_regex).pack(anchor="w")
+        
+
+        button_frame = ctk.CTkFrame(main_frame, fg_color="transparent")
+        button_frame.grid(row=4, column=0, columnspan=3, pady=10)
+        
+        def find_all_action():
+            find_text = find_entry.get()
+            folder = folder_entry.get()
+            if not find_text:
+                return
+            if not os.path.isdir(folder):
+                messagebox.showerror("Find in Files", f"Folder not found: {folder}", parent=find_window)
+                return
+            
+            query = SearchQuery(find_text, match_case.get(), whole_word.get(), use_regex.get())
+            try:
+                query.compile()
+            except re.error as e:
+                messagebox.showerror("Find in Files", f"Invalid regular expression: {e}", parent=find_window)
+                return
+            
+            patterns = tuple(pattern.strip() for pattern in patterns_entry.get().split(";") if pattern.strip()) or ("*",)
+            find_window.destroy()
+            self.find_in_files(folder, query, patterns)
+        
+        ctk.CTkButton(button_frame, text="Find All", command=find_all_action, width=100).pack(side="left", padx=5)
+        ctk.CTkButton(button_frame, text="Cancel", command=find_window.destroy, width=100).pack(side="left", padx=5)
+        
+
+        main_frame.columnconfigure(1, weight=1)
+        
+        find_entry.bind("<Return>", lambda e: find_all_action())
+        find_entry.focus_set()
+    
+    def find_in_files(self, folder, query, patterns=("*",)):
+        self.cancel_find_in_files()
+        if self.find_pool is None:
+            import concurrent.futures
+            import multiprocessing
+            # Workers are spawned rather than forked so they never inherit
+            # the Tk interpreter or the locks of our background threads.
+            self.find_pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.find_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        
+        self.find_in_files_folder = folder
+        self.find_results = []
+        self.find_results_list.delete(0, tk.END)
+        if not self.find_results_frame.winfo_ismapped():
+            self.find_results_frame.pack(fill="x", side="bottom", padx=5, pady=(0, 5))
+        self.find_search = FileSearch(self.find_pool, self.find_workers, folder, query, patterns)
+        self.find_stop_btn.configure(state="normal")
+        self._poll_find_in_files()
+    
+    def _poll_find_in_files(self):
+        self._find_poll_id = None
+        search = self.find_search
+        if search is None:
+            return
+        
+        finished = search.done
+        rows = []
+        while len(self.find_results) + len(rows) < FIND_MAX_RESULTS:
+            try:
+                found = search.results.get_nowait()
+            except queue.Empty:
+                break
+            for path, results in found:
+                name = os.path.relpath(path, search.folder)
+                for line, column, length, preview in results:
+                    self.find_results.append((path, line, column, length))
+                    rows.append(f"{name}:{line}:{column + 1}: {preview}")
+        if rows:
+            self.find_results_list.insert(tk.END, *rows)
+        
+        limited = len(self.find_results) >= FIND_MAX_RESULTS
+        if limited:
+            search.cancel()
+        files = len({path for path, line, column, length in self.find_results}) if finished or limited else None
+        summary = f"{len(self.find_results):,} matches in {search.files_scanned:,} files scanned"
+        if search.error is not None:
+            self.find_results_label.configure(text=f"Search failed: {search.error}")
+        elif limited:
+            self.find_results_label.configure(text=f"{summary} (stopped at {FIND_MAX_RESULTS:,} matches, {files:,} files)")
+        elif search.cancelled and finished:
+            self.find_results_label.configure(text=f"{summary} (cancelled)")
+        elif finished:
+            self.find_results_label.configure(text=f"{len(self.find_results):,} matches in {files:,} of {search.files_scanned:,} files")
+        else:
+            self.find_results_label.configure(text=f"Searching... {summary}")
+        
+        if (finished and search.results.empty()) or limited:
+            self.find_search = None
+            self.find_stop_btn.configure(state="disabled")
+        else:
+            self._find_poll_id = self.root.after(50, self._poll_find_in_files)
+    
+    def cancel_find_in_files(self):
+        if self.find_search is not None:
+            self.find_search.cancel()
+            if self._find_poll_id is None:
+                self._find_poll_id = self.root.after(50, self._poll_find_in_files)
+    
+    def close_find_results(self):
+        self.cancel_find_in_files()
+        self.find_results_frame.pack_forget()
+    
+    def open_find_result(self, event=None):
+        selection = self.find_results_list.curselection()
+        if not selection:
+            return
+        
+        path, line, column, length = self.find_results[selection[0]]
+        if self.current_file is None or os.path.abspath(self.current_file) != os.path.abspath(path):
+            self.open_file(path)
+            if self.current_file is None or os.path.abspath(self.current_file) != os.path.abspath(path):
+                return
+        self.goto_position(line, column, length)
+    
+    def goto_position(self, line, column, length=0):
+        if self.file_loader is not None:
+            self.pending_goto = (line, column, length)
+            return
+        
+        self.pending_goto = None
+        if self.large_file_view is not None:
+            # Find in Files reports Python columns; the view wants Tk's.
+            text = self.large_file_view.document.read_lines(line - 1, 1)
+            start = tk_length(text[:column])
+            self.large_file_view.show_match(line - 1, start, start + tk_length(text[column:column + length]))
+        else:
+            offset = self.document.offset(line - 1, column)
+            index = self.document.index(offset)
+            self.text_area.tag_remove("sel", "1.0", tk.END)
+            self.text_area.tag_add("sel", index, self.document.index(offset + length))
+            self.text_area.mark_set(tk.INSERT, index)
+            self.text_area.see(tk.INSERT)
+        self.text_area.focus_set()
+        self.update_cursor_position()
+    
     def toggle_word_wrap(self):
-        current_wrap = self.text_area.cget("wrap")
-        new_wrap = "word" if current_wrap == "none" else "none"
-        self.text_area.configure(wrap=new_wrap)
+        self.word_wrap = "word" if self.word_wrap == "none" else "none"
+        for tab in self.tabs:
+            if tab.text_area is not None:
+                tab.text_area.configure(wrap=self.word_wrap)
     
     def choose_font(self):
         font_window = tk.Toplevel(self.root)
@@ -844,9 +2528,7 @@ class NotepadClone:
         font_window.configure(bg="#343333")
         font_window.iconbitmap('')
         try:
-            img = Image.open("logo.ico")
-            photo = ImageTk.PhotoImage(img)
-            font_window.iconphoto(False, photo)
+            font_window.iconphoto(False, load_photo_image("logo.ico"))
         except:
             pass
 
@@ -862,6 +2544,9 @@ class NotepadClone:
         font_list_frame = ctk.CTkFrame(main_frame)
         font_list_frame.grid(row=0, column=1, sticky="w", padx=10, pady=(10, 5))
         
+        font_filter = ctk.CTkEntry(font_list_frame, placeholder_text="Filter fonts...", height=28)
+        font_filter.pack(side="top", fill="x", pady=(0, 5))
+        
         font_listbox = tk.Listbox(
             font_list_frame,
             selectmode="single",
@@ -880,15 +2565,26 @@ class NotepadClone:
         font_scrollbar.pack(side="right", fill="y")
         font_listbox.configure(yscrollcommand=font_scrollbar.set)
         
-        all_fonts = sorted(tkFont.families())
-        for font in all_fonts:
-            font_listbox.insert(tk.END, font)
-        
-
-        if self.font_family in all_fonts:
-            index = all_fonts.index(self.font_family)
+        shown = []
+        
+        def show_fonts(event=None):
+            selection = font_listbox.curselection()
+            selected = font_listbox.get(selection[0]) if selection else self.font_family
+            shown[:] = filter_fonts(font_filter.get())
+            font_listbox.delete(0, tk.END)
+            font_listbox.insert(tk.END, *shown)
+            if selected in shown:
+                index = shown.index(selected)
+            elif shown and event is not None:
+                index = 0
+            else:
+                return
             font_listbox.selection_set(index)
             font_listbox.see(index)
+            if event is not None:
+                update_sample()
+        
+        show_fonts()
         
 
         ctk.CTkLabel(main_frame, text="Font style:").grid(row=1, column=0, sticky="w", padx=10, pady=5)
@@ -928,7 +2624,9 @@ class NotepadClone:
         )
         sample_text.grid(row=1, column=0, sticky="nsew", padx=10, pady=(0, 5))
         sample_text.insert("1.0", "AaBbYyZz")
-        sample_text.config(state="disabled")
+        if self.preview_font is None:
+            self.preview_font = tkFont.Font(root=self.root)
+        sample_text.config(state="disabled", font=self.preview_font)
 
         button_frame = ctk.CTkFrame(font_window, fg_color="transparent")
         button_frame.pack(fill="x", side="bottom", padx=20, pady=10)
@@ -943,12 +2641,7 @@ class NotepadClone:
                 weight = "bold" if "Bold" in font_style_str else "normal"
                 slant = "italic" if "Italic" in font_style_str else "roman"
                 
-                sample_text.config(state="normal")
-                sample_text.delete("1.0", "end")
-                sample_text.insert("1.0", "AaBbYyZz")
-                sample_text.tag_add("sample", "1.0", "end")
-                sample_text.tag_config("sample", font=(font_family, font_size, weight, slant))
-                sample_text.config(state="disabled")
+                self.preview_font.configure(family=font_family, size=font_size, weight=weight, slant=slant)
             except (ValueError, tk.TclError):
                 pass
 
@@ -961,19 +2654,17 @@ class NotepadClone:
                 font_size = int(size_var.get())
                 font_style_str = style_var.get()
                 
-                weight = "bold" if "Bold" in font_style_str else "normal"
-                slant = "italic" if "Italic" in font_style_str else "roman"
-                
                 self.font_family = font_family
                 self.font_size = font_size
                 self.font_style = font_style_str
                 
-                self.text_area.configure(font=(self.font_family, self.font_size, weight, slant))
+                self.update_font()
                 font_window.destroy()
             except (ValueError, tk.TclError):
                 messagebox.showerror("Error", "Invalid font selection.")
 
         font_listbox.bind("<<ListboxSelect>>", lambda e: update_sample())
+        font_filter.bind("<KeyRelease>", show_fonts)
         style_var.trace("w", lambda *args: update_sample())
         size_var.trace("w", lambda *args: update_sample())
         
@@ -984,20 +2675,37 @@ class NotepadClone:
 
     def zoom_in(self):
         self.font_size = min(self.font_size + 1, 72)
-        self.update_font()
+        self.schedule_font_update()
     
     def zoom_out(self):
         self.font_size = max(self.font_size - 1, 6)
-        self.update_font()
+        self.schedule_font_update()
+    
+    def schedule_font_update(self):
+        # A fast wheel spin produces many zoom steps; only the last size
+        # is laid out, once per frame.
+        if self._font_update_id is None:
+            self._font_update_id = self.root.after(ZOOM_FRAME_MS, self.update_font)
     
     def update_font(self):
-        weight = "bold" if "Bold" in self.font_style else "normal"
-        slant = "italic" if "Italic" in self.font_style else "roman"
-        self.text_area.configure(font=(self.font_family, self.font_size, weight, slant))
+        if self._font_update_id is not None:
+            self.root.after_cancel(self._font_update_id)
+            self._font_update_id = None
+        
+        options = self.font_options()
+        if all(str(self.editor_font.cget(key)) == str(value) for key, value in options.items()):
+            return
+        text_area = self.active_tab.text_area if self.active_tab is not None else None
+        top = text_area.index("@0,0") if text_area is not None else None
+        # Every text area shares this font, so configuring it relayouts all
+        # of them without building a new font per widget.
+        self.editor_font.configure(**options)
+        if top is not None:
+            text_area.yview(top)
     
     def reset_zoom(self):
         self.font_size = 11
-        self.update_font()
+        self.schedule_font_update()
     
     def toggle_status_bar(self):
         if self.status_bar.winfo_viewable():
@@ -1005,16 +2713,267 @@ class NotepadClone:
         else:
             self.status_bar.pack(fill="x", side="bottom", padx=5, pady=(0, 5))
     
+    def _trace_buffer_size(self):
+        tab = self.active_tab
+        if tab is None or tab.edit_recorder is None:
+            return 0
+        return tab.edit_recorder.length
+
+    def toggle_performance_overlay(self):
+        if self.trace_overlay is not None:
+            self.root.after_cancel(self._trace_overlay_id)
+            self.trace_overlay.destroy()
+            self.trace_overlay = None
+            if not self.trace_requested:
+                self.tracer.disable()
+            return
+        self.tracer.enable()
+        self.trace_overlay = tk.Label(
+            self.text_frame,
+            bg="#2b2b2b",
+            fg="#d0d0d0",
+            font=("Consolas", 9),
+            justify="left",
+            anchor="nw",
+            padx=8,
+            pady=6
+        )
+        self.trace_overlay.place(relx=1.0, x=-24, y=8, anchor="ne")
+        self._refresh_performance_overlay()
+
+    def _refresh_performance_overlay(self):
+        lines = [f"{'handler':<36}{'calls':>7}{'p50 ms':>9}{'p99 ms':>9}"]
+        for name, count, p50, p99, _longest in self.tracer.summary()[:TRACE_OVERLAY_ROWS]:
+            lines.append(f"{name[-36:]:<36}{count:>7}{p50:>9.2f}{p99:>9.2f}")
+        self.ui.configure(self.trace_overlay, text="\n".join(lines))
+        self.trace_overlay.lift()
+        self._trace_overlay_id = self.root.after(TRACE_OVERLAY_MS, self._refresh_performance_overlay)
+
+    def export_trace(self):
+        if not self.tracer.events:
+            messagebox.showinfo("Export Event Trace", "No events have been traced yet. Turn on View > Performance Overlay or start Gnotepad with --trace.")
+            return
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".json",
+            initialfile="gnotepad-trace.json",
+            filetypes=[("Trace files", "*.json"), ("All files", "*.*")]
+        )
+        if not file_path:
+            return
+        try:
+            self.tracer.export(file_path)
+        except OSError as e:
+            messagebox.showerror("Error", f"Failed to export trace: {str(e)}")
+            return
+        self.set_status(f"Exported {len(self.tracer.events):,} events to {os.path.basename(file_path)}")
+    
+    def journal_edit(self, tab, delta):
+        if not tab.is_modified:
+            self.discard_journal(tab)
+            return
+        if tab.journal_name is None or tab.journal_bytes > JOURNAL_COMPACT_BYTES:
+            self.checkpoint_journal(tab, tab.document.pieces())
+        else:
+            self.journal.append(tab.journal_name, delta)
+            tab.journal_bytes += len(delta.inserted)
+    
+    def checkpoint_journal(self, tab, text):
+        if tab.journal_name is None:
+            import uuid
+            tab.journal_name = f"{uuid.uuid4().hex}.journal"
+        tab.journal_bytes = 0
+        meta = {
+            "path": tab.current_file,
+            "encoding": tab.file_format.encoding,
+            "bom": tab.file_format.bom.hex(),
+            "newline": tab.file_format.newline,
+        }
+        self.journal.checkpoint(tab.journal_name, meta, text)
+    
+    def discard_journal(self, tab):
+        if tab.journal_name is not None:
+            self.journal.discard(tab.journal_name)
+            tab.journal_name = None
+    
+    def recover_journals(self):
+        # Only journals left by instances that have exited are offered; a
+        # second instance leaves the first one's live journals alone.
+        orphans = orphaned_journals(self.journal.root, self.journal.directory)
+        journals = [path for _directory, paths in orphans for path in paths]
+        recover = bool(journals) and messagebox.askyesno(
+            "Recover Documents",
+            "Gnotepad did not close properly.\n"
+            f"Recover {len(journals)} unsaved document(s)?"
+        )
+        failed = set()
+        for path in journals if recover else ():
+            try:
+                meta, text = replay_journal(path)
+                file_format = FileFormat(meta["encoding"], bytes.fromhex(meta["bom"]), meta["newline"], newline_seen=True)
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                messagebox.showerror("Error", f"Failed to recover {os.path.basename(path)}: {str(e)}")
+                failed.add(path)
+                continue
+            tab = self.find_tab(meta["path"]) if meta.get("path") else None
+            if tab is None:
+                tab = self.add_tab(meta.get("path"), lazy=True)
+            tab.file_format = file_format
+            tab.stored = CompressedText(text)
+            tab.loaded = True
+            tab.session_buffer = None
+            tab.is_modified = True
+            tab.modification_tracker.mark_unsaved()
+            # The old journal may end in a torn record that later appends
+            # would sit behind, so the text moves to a fresh one.
+            self.discard_journal(tab)
+            self.checkpoint_journal(tab, text)
+            self.update_tab_label(tab)
+        
+        for directory, paths in orphans:
+            for path in paths:
+                if path not in failed:
+                    self.journal.remove(path)
+            if not failed.intersection(paths):
+                self.journal.remove(os.path.join(directory, JOURNAL_LOCK))
+                self.journal.remove(directory)
+    
+    def session_state(self):
+        documents = []
+        for tab in self.tabs:
+            if tab.current_file is None and not tab.is_modified:
+                continue
+            cursor, top = tab.cursor, tab.top
+            if tab.text_area is not None:
+                cursor = self.tab_cursor(tab)
+                if tab.large_file_view is None:
+                    top = tab.text_area.yview()[0]
+            entry = {
+                "path": tab.current_file,
+                "cursor": cursor,
+                "top": top,
+                "large_file": tab.large_file_view is not None or tab.large_file,
+                "encoding": tab.file_format.encoding,
+                "bom": tab.file_format.bom.hex(),
+                "newline": tab.file_format.newline,
+                "active": tab is self.active_tab,
+            }
+            if tab.is_modified and tab.large_file_view is None:
+                entry["buffer"] = self._session_buffer(tab)
+            documents.append(entry)
+        
+        return {
+            "documents": documents,
+            "search": self.search_entry.get(),
+            "settings": {
+                "geometry": self.root.geometry(),
+                "font_family": self.font_family,
+                "font_size": self.font_size,
+                "font_style": self.font_style,
+                "word_wrap": self.word_wrap,
+                "status_bar": self.status_bar.winfo_ismapped(),
+                "find_in_files_folder": self.find_in_files_folder,
+                "recent_files": self.recent_files,
+            },
+        }
+    
+    def _session_buffer(self, tab):
+        generation = tab.modification_tracker.generation
+        if tab.session_buffer is None or tab.session_generation != generation:
+            tab.session_buffer = tab.stored if tab.stored is not None else CompressedText(tab.document.pieces())
+            tab.session_generation = generation
+        return tab.session_buffer
+    
+    def save_session(self):
+        self.session.save(self.session_state())
+    
+    def _autosave_session(self):
+        if self.session.owned:
+            self.session.save_in_background(self.session_state())
+        self._session_id = self.root.after(SESSION_INTERVAL_MS, self._autosave_session)
+    
+    def restore_session(self):
+        if not self.session.claim():
+            return None
+        state = self.session.load()
+        if state is None:
+            return None
+        
+        settings = state.get("settings") or {}
+        self.font_family = settings.get("font_family", self.font_family)
+        self.font_size = settings.get("font_size", self.font_size)
+        self.font_style = settings.get("font_style", self.font_style)
+        self.word_wrap = settings.get("word_wrap", self.word_wrap)
+        self.find_in_files_folder = settings.get("find_in_files_folder")
+        self.recent_files = list(settings.get("recent_files", []))[:RECENT_FILES_LIMIT]
+        if settings.get("geometry"):
+            self.root.geometry(settings["geometry"])
+        if not settings.get("status_bar", True):
+            self.status_bar.pack_forget()
+        self.update_font()
+        
+        # Only metadata is read here; buffers and files are read when their
+        # tab is first shown, so startup does not depend on the session size.
+        active = None
+        for entry in state.get("documents", []):
+            try:
+                tab = self.add_tab(entry.get("path"), lazy=True)
+                tab.cursor = entry.get("cursor", "1.0")
+                tab.top = entry.get("top", 0.0)
+                tab.large_file = entry.get("large_file", False)
+                tab.file_format = FileFormat(entry["encoding"], bytes.fromhex(entry["bom"]), entry["newline"], newline_seen=True)
+            except (KeyError, ValueError, TypeError):
+                continue
+            if entry.get("buffer"):
+                tab.loaded = False
+                tab.session_buffer = entry["buffer"]
+                tab.session_generation = tab.modification_tracker.generation
+                tab.is_modified = True
+                tab.modification_tracker.mark_unsaved()
+            self.update_tab_label(tab)
+            if entry.get("active"):
+                active = tab
+        
+        if state.get("search"):
+            self.search_entry.insert(0, state["search"])
+        return active
+    
     def show_about(self):
         messagebox.showinfo("About", "Gnotepad\nBuilt with Love\nA modern, feature-rich text editor")
     
+    def hot_exit(self):
+        # Only the instance that owns the session can keep unsaved documents
+        # in it; any other asks about them like a plain editor.
+        if not self.session.owned:
+            return False
+        self.session.wait()
+        try:
+            self.save_session()
+        except OSError as e:
+            messagebox.showerror("Error", f"Failed to save session: {str(e)}")
+            return False
+        return True
+    
     def exit_app(self):
-        if self.ask_save_changes():
-            self.root.quit()
+        self.wait_for_saves()
+        if not self.hot_exit():
+            for tab in list(self.tabs):
+                if tab.is_modified:
+                    self.activate_tab(tab)
+                    if not self.ask_save_changes():
+                        return
+            self.wait_for_saves()
+        self.journal.close(discard=True)
+        if self.find_pool is not None:
+            self.cancel_find_in_files()
+            self.find_pool.shutdown(wait=False, cancel_futures=True)
+        self.root.quit()
     
     def run(self):
         self.root.mainloop()
 
 if __name__ == "__main__":
-    app = NotepadClone()
+    if getattr(sys, "frozen", False):
+        import multiprocessing
+        multiprocessing.freeze_support()
+    app = NotepadClone(StartupProfile("--startup-profile" in sys.argv[1:], _START_TIME), trace="--trace" in sys.argv[1:])
     app.run()
\ No newline at end of file
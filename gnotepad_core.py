@@ -0,0 +1,2007 @@
+import os
+import functools
+import shutil
+import tempfile
+import mmap
+import bisect
+import itertools
+import operator
+from array import array
+import io
+import codecs
+import re
+import threading
+import random
+import queue
+import collections
+import fnmatch
+import zlib
+import json
+import struct
+import time
+
+# Document model, undo history, search and file I/O for gnotepad. Nothing in
+# here touches Tk, so it can be driven headless (see benchmarks/).
+
+
+class EditDelta:
+    __slots__ = ("offset", "removed", "inserted")
+
+    def __init__(self, offset, removed, inserted):
+        self.offset = offset
+        self.removed = removed
+        self.inserted = inserted
+
+    def inverted(self):
+        return EditDelta(self.offset, self.inserted, self.removed)
+
+    def __repr__(self):
+        return f"EditDelta({self.offset!r}, {self.removed!r}, {self.inserted!r})"
+
+
+def _is_word_char(ch):
+    return ch.isalnum() or ch == "_"
+
+
+def _is_whole_word(text, first, last):
+    return not (first > 0 and _is_word_char(text[first - 1])) and not (last < len(text) and _is_word_char(text[last]))
+
+
+# Tk counts a character outside the Basic Multilingual Plane, such as an
+# emoji, as two (its UTF-16 surrogate pair), so Tk columns run ahead of
+# Python offsets by the number of those characters before them.
+_ASTRAL = re.compile("[\U00010000-\U0010ffff]")
+
+
+def has_astral(text):
+    return not text.isascii() and _ASTRAL.search(text) is not None
+
+
+def tk_length(text):
+    if text.isascii():
+        return len(text)
+    return len(text) + len(_ASTRAL.findall(text))
+
+
+class _TextBuffer:
+    __slots__ = ("text", "_newlines", "_wides")
+
+    scan_limit = 256
+
+    def __init__(self, text):
+        self.text = text
+        self._newlines = None
+        self._wides = None
+
+    def newlines(self):
+        if self._newlines is None:
+            parts = self.text.split("\n")
+            parts.pop()
+            self._newlines = array("q", map(operator.add, itertools.accumulate(map(len, parts)), itertools.count()))
+        return self._newlines
+
+    def count(self, start, end):
+        if end - start <= self.scan_limit or (start == 0 and end == len(self.text)):
+            return self.text.count("\n", start, end)
+        newlines = self.newlines()
+        return bisect.bisect_left(newlines, end) - bisect.bisect_left(newlines, start)
+
+    def find(self, start, nth):
+        # Position of the nth (1-based) newline at or after start.
+        if nth <= 8:
+            position = start - 1
+            for _ in range(nth):
+                position = self.text.find("\n", position + 1)
+            return position
+        newlines = self.newlines()
+        return newlines[bisect.bisect_left(newlines, start) + nth - 1]
+
+    def wides(self):
+        # Positions of the characters Tk counts twice.
+        if self._wides is None:
+            text = self.text
+            self._wides = array("q") if text.isascii() else array("q", (match.start() for match in _ASTRAL.finditer(text)))
+        return self._wides
+
+    def count_wide(self, start, end):
+        wides = self.wides()
+        if not wides:
+            return 0
+        return bisect.bisect_left(wides, end) - bisect.bisect_left(wides, start)
+
+    def offset_of_units(self, start, units):
+        # Length of the text from start that Tk counts as units characters,
+        # rounded down to the start of a character Tk counts twice.
+        wides = self.wides()
+        first = bisect.bisect_left(wides, start)
+        low = first
+        high = bisect.bisect_left(wides, start + units)
+        while low < high:
+            middle = (low + high) // 2
+            if wides[middle] - start + middle - first < units:
+                low = middle + 1
+            else:
+                high = middle
+        return units - (low - first)
+
+
+class _Piece:
+    __slots__ = ("buffer", "start", "length", "newlines", "wide", "priority", "left", "right", "size", "lines", "wides")
+
+    def __init__(self, buffer, start, length, newlines=None):
+        self.buffer = buffer
+        self.start = start
+        self.length = length
+        self.newlines = buffer.count(start, start + length) if newlines is None else newlines
+        self.wide = buffer.count_wide(start, start + length)
+        self.priority = random.random()
+        self.left = None
+        self.right = None
+        self.size = length
+        self.lines = self.newlines
+        self.wides = self.wide
+
+    def update(self):
+        size = self.length
+        lines = self.newlines
+        wides = self.wide
+        if self.left is not None:
+            size += self.left.size
+            lines += self.left.lines
+            wides += self.left.wides
+        if self.right is not None:
+            size += self.right.size
+            lines += self.right.lines
+            wides += self.right.wides
+        self.size = size
+        self.lines = lines
+        self.wides = wides
+        return self
+
+
+def _merge_pieces(left, right):
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        left.right = _merge_pieces(left.right, right)
+        return left.update()
+    right.left = _merge_pieces(left, right.left)
+    return right.update()
+
+
+def _split_pieces(node, offset):
+    if node is None:
+        return None, None
+    left_size = node.left.size if node.left is not None else 0
+    if offset <= left_size:
+        left, node.left = _split_pieces(node.left, offset)
+        return left, node.update()
+    offset -= left_size
+    if offset >= node.length:
+        node.right, right = _split_pieces(node.right, offset - node.length)
+        return node.update(), right
+    tail = _Piece(node.buffer, node.start + offset, node.length - offset)
+    tail.right = node.right
+    node.right = None
+    node.newlines -= tail.newlines
+    node.wide -= tail.wide
+    node.length = offset
+    return node.update(), tail.update()
+
+
+def _collect_pieces(node, start, end, result):
+    while node is not None:
+        left_size = node.left.size if node.left is not None else 0
+        if start < left_size:
+            _collect_pieces(node.left, start, min(end, left_size), result)
+        low = max(start - left_size, 0)
+        high = min(end - left_size, node.length)
+        if low < high:
+            result.append((node.buffer.text, node.start + low, node.start + high))
+        consumed = left_size + node.length
+        if end <= consumed:
+            return
+        start = max(start - consumed, 0)
+        end -= consumed
+        node = node.right
+
+
+class PieceTable:
+    # A treap of pieces over immutable text buffers. Every subtree knows its
+    # length and newline count, so offsets, lines and columns convert in
+    # O(log n) and edits never copy the text around them.
+    def __init__(self, text=""):
+        self.clear()
+        if text:
+            self.insert(0, text)
+
+    def clear(self):
+        self._root = None
+
+    def __len__(self):
+        return self._root.size if self._root is not None else 0
+
+    @property
+    def line_count(self):
+        return (self._root.lines if self._root is not None else 0) + 1
+
+    def insert(self, offset, text):
+        if not text:
+            return
+        left, right = _split_pieces(self._root, offset)
+        self._root = _merge_pieces(_merge_pieces(left, _Piece(_TextBuffer(text), 0, len(text))), right)
+
+    def delete(self, offset, length):
+        if length <= 0:
+            return
+        left, right = _split_pieces(self._root, offset)
+        _removed, right = _split_pieces(right, length)
+        self._root = _merge_pieces(left, right)
+
+    def apply(self, delta):
+        self.delete(delta.offset, len(delta.removed))
+        self.insert(delta.offset, delta.inserted)
+
+    def replace_spans(self, content, spans, texts):
+        # content, the current text, with each sorted (start, end) span
+        # replaced by the matching entry of texts, built as a single piece
+        # instead of one split and merge per span.
+        parts = []
+        position = 0
+        for (first, last), text in zip(spans, texts):
+            parts.append(content[position:first])
+            parts.append(text)
+            position = last
+        parts.append(content[position:])
+        self.clear()
+        self.insert(0, "".join(parts))
+
+    def pieces(self, start=0, end=None):
+        end = len(self) if end is None else min(end, len(self))
+        result = []
+        if start < end:
+            _collect_pieces(self._root, start, end, result)
+        return result
+
+    def get(self, start=0, end=None):
+        start = max(start, 0)
+        return "".join(text[low:high] for text, low, high in self.pieces(start, end))
+
+    def text(self):
+        return self.get()
+
+    def line_of(self, offset):
+        node = self._root
+        lines = 0
+        while node is not None:
+            left = node.left
+            if left is not None:
+                if offset < left.size:
+                    node = left
+                    continue
+                offset -= left.size
+                lines += left.lines
+            if offset < node.length:
+                return lines + node.buffer.count(node.start, node.start + offset)
+            offset -= node.length
+            lines += node.newlines
+            node = node.right
+        return lines
+
+    def line_start(self, line):
+        if line <= 0:
+            return 0
+        node = self._root
+        if node is None or line > node.lines:
+            return len(self)
+        position = 0
+        while True:
+            left = node.left
+            if left is not None:
+                if line <= left.lines:
+                    node = left
+                    continue
+                line -= left.lines
+                position += left.size
+            if line <= node.newlines:
+                return position + node.buffer.find(node.start, line) - node.start + 1
+            line -= node.newlines
+            position += node.length
+            node = node.right
+
+    def position(self, offset):
+        line = self.line_of(offset)
+        return line, offset - self.line_start(line)
+
+    def _wides_before(self, offset):
+        node = self._root
+        wides = 0
+        while node is not None:
+            left = node.left
+            if left is not None:
+                if offset < left.size:
+                    node = left
+                    continue
+                offset -= left.size
+                wides += left.wides
+            if offset < node.length:
+                return wides + node.buffer.count_wide(node.start, node.start + offset)
+            offset -= node.length
+            wides += node.wide
+            node = node.right
+        return wides
+
+    def _offset_of_units(self, units):
+        # Inverse of offset + _wides_before(offset): the offset Tk would
+        # count as units characters from the start of the text.
+        node = self._root
+        offset = 0
+        while node is not None:
+            left = node.left
+            if left is not None:
+                if units < left.size + left.wides:
+                    node = left
+                    continue
+                units -= left.size + left.wides
+                offset += left.size
+            if units < node.length + node.wide:
+                return offset + node.buffer.offset_of_units(node.start, units)
+            units -= node.length + node.wide
+            offset += node.length
+            node = node.right
+        return offset
+
+    def offset(self, line, column):
+        start = self.line_start(line)
+        return min(start + column, self.line_start(line + 1) - (1 if line + 1 < self.line_count else 0))
+
+    def index(self, offset):
+        # Tk index of offset, with columns counted the way Tk counts them.
+        line, column = self.position(offset)
+        if self._root is not None and self._root.wides:
+            column += self._wides_before(offset) - self._wides_before(offset - column)
+        return f"{line + 1}.{column}"
+
+    def offset_of_index(self, index):
+        line, column = index.split(".")
+        line = int(line) - 1
+        column = int(column)
+        if self._root is not None and self._root.wides:
+            start = self.line_start(line)
+            column = self._offset_of_units(start + self._wides_before(start) + column) - start
+        return self.offset(line, column)
+
+
+_HASH_MODULUS = (1 << 61) - 1
+
+
+def _hash_text(text):
+    return int.from_bytes(text.encode("utf-32-be"), "big") % _HASH_MODULUS
+
+
+def _hash_concat(left_hash, right_hash, right_length):
+    return (left_hash * pow(2, 32 * right_length, _HASH_MODULUS) + right_hash) % _HASH_MODULUS
+
+
+class ModificationTracker:
+    def __init__(self, fetch=None, window_limit=1 << 16):
+        self.fetch = fetch
+        self.window_limit = window_limit
+        self.generation = 0
+        self.saved_generation = 0
+        self.modified = False
+        self._reset_window()
+
+    def _reset_window(self):
+        self._window = None
+        self._saved_hash = 0
+        self._saved_length = 0
+        self._tracking = self.fetch is not None
+
+    def mark_saved(self):
+        self.saved_generation = self.generation
+        self.modified = False
+        self._reset_window()
+
+    def mark_saved_at(self, generation):
+        if generation == self.generation:
+            self.mark_saved()
+        else:
+            self.saved_generation = generation
+            self.modified = True
+            self._tracking = False
+
+    def mark_unsaved(self):
+        self.saved_generation = -1
+        self.modified = True
+        self._tracking = False
+
+    def record(self, delta):
+        self.generation += 1
+        if self._tracking:
+            self._extend_window(delta)
+        if self._tracking:
+            self.modified = not self._window_matches_saved()
+        else:
+            self.modified = self.generation != self.saved_generation
+        return self.modified
+
+    def _extend_window(self, delta):
+        offset = delta.offset
+        removed_end = offset + len(delta.removed)
+        growth = len(delta.inserted) - len(delta.removed)
+        if self._window is None:
+            if max(len(delta.removed), len(delta.inserted)) > self.window_limit:
+                self._tracking = False
+                return
+            self._window = (offset, offset + len(delta.inserted))
+            self._saved_hash = _hash_text(delta.removed)
+            self._saved_length = len(delta.removed)
+            return
+
+        low, high = self._window
+        span = max(high, removed_end) - min(low, offset)
+        if span > self.window_limit or span + growth > self.window_limit:
+            self._tracking = False
+            return
+
+        left = right = ""
+        if offset < low:
+            left = delta.removed[:low - offset]
+            if removed_end < low:
+                left += self.fetch(offset + len(delta.inserted), low + growth)
+        if removed_end > high:
+            if offset > high:
+                right = self.fetch(high, offset)
+            right += delta.removed[max(0, high - offset):]
+
+        saved_hash = _hash_concat(_hash_text(left), self._saved_hash, self._saved_length)
+        self._saved_hash = _hash_concat(saved_hash, _hash_text(right), len(right))
+        self._saved_length += len(left) + len(right)
+        self._window = (min(low, offset), max(high, removed_end) + growth)
+
+    def _window_matches_saved(self):
+        low, high = self._window
+        if high - low != self._saved_length:
+            return False
+        return _hash_text(self.fetch(low, high)) == self._saved_hash
+
+
+_WORD_CHUNK = 1 << 20
+
+
+def count_words(text):
+    words = 0
+    for start in range(0, len(text), _WORD_CHUNK):
+        chunk = text[start:start + _WORD_CHUNK]
+        words += len(chunk.split())
+        if start and not chunk[0].isspace() and not text[start - 1].isspace():
+            words -= 1
+    return words
+
+
+def _text_counts(text, before, after):
+    return (
+        len(text),
+        count_words(before + text + after) if text else len((before + after).split()),
+        text.count("\n"),
+        len(text.encode("utf-8", "surrogatepass")),
+    )
+
+
+def _delta_counts(delta, before, after):
+    inserted = _text_counts(delta.inserted, before, after)
+    removed = _text_counts(delta.removed, before, after)
+    return tuple(a - b for a, b in zip(inserted, removed))
+
+
+def format_size(size):
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+class DocumentStats:
+    def __init__(self, bulk_threshold=1 << 20):
+        self.bulk_threshold = bulk_threshold
+        self.pending = 0
+        self._epoch = 0
+        self._results = queue.SimpleQueue()
+        self.reset()
+
+    def reset(self):
+        self._epoch += 1
+        self.pending = 0
+        self.characters = 0
+        self.words = 0
+        self.lines = 1
+        self.bytes = 0
+
+    def apply(self, delta, before="", after=""):
+        if len(delta.inserted) + len(delta.removed) > self.bulk_threshold:
+            self.pending += 1
+            threading.Thread(
+                target=self._count_in_background,
+                args=(self._epoch, delta, before, after),
+                daemon=True
+            ).start()
+        else:
+            self.add_counts(_delta_counts(delta, before, after))
+
+    def _count_in_background(self, epoch, delta, before, after):
+        self._results.put((epoch, _delta_counts(delta, before, after)))
+
+    def collect(self):
+        while True:
+            try:
+                epoch, counts = self._results.get_nowait()
+            except queue.Empty:
+                return self.pending == 0
+            if epoch == self._epoch:
+                self.pending -= 1
+                self.add_counts(counts)
+
+    def add_counts(self, counts):
+        self.characters += counts[0]
+        self.words += counts[1]
+        self.lines += counts[2]
+        self.bytes += counts[3]
+
+
+FORMAT_SAMPLE_SIZE = 1 << 16
+ASCII_COMPATIBLE_ENCODINGS = ("utf-8", "cp1252", "latin-1")
+
+_BYTE_ORDER_MARKS = (
+    (codecs.BOM_UTF32_LE, "utf-32-le"),
+    (codecs.BOM_UTF32_BE, "utf-32-be"),
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+)
+
+_ENCODING_LABELS = {
+    "utf-8": "UTF-8",
+    "utf-16-le": "UTF-16 LE",
+    "utf-16-be": "UTF-16 BE",
+    "utf-32-le": "UTF-32 LE",
+    "utf-32-be": "UTF-32 BE",
+    "cp1252": "Windows-1252",
+    "latin-1": "ISO-8859-1",
+}
+
+_NEWLINE_LABELS = {"\r\n": "CRLF", "\n": "LF", "\r": "CR"}
+
+
+class FileFormat:
+    def __init__(self, encoding="utf-8", bom=b"", newline=os.linesep, mixed_newlines=False, newline_seen=False):
+        self.encoding = encoding
+        self.bom = bom
+        self.newline = newline
+        self.mixed_newlines = mixed_newlines
+        self.newline_seen = newline_seen
+
+    @property
+    def encoding_label(self):
+        label = _ENCODING_LABELS.get(self.encoding, self.encoding.upper())
+        return f"{label} BOM" if self.bom and self.encoding == "utf-8" else label
+
+    @property
+    def newline_label(self):
+        label = _NEWLINE_LABELS[self.newline]
+        return f"Mixed ({label})" if self.mixed_newlines else label
+
+    def update_newlines(self, seen):
+        if isinstance(seen, tuple):
+            self.mixed_newlines = True
+            if not self.newline_seen:
+                self.newline = seen[-1]
+        elif seen is not None and not self.newline_seen:
+            self.newline = seen
+        self.newline_seen = self.newline_seen or seen is not None
+
+
+def _guess_encoding(sample, complete):
+    if not sample:
+        return "utf-8"
+    half = len(sample) // 2 or 1
+    even_zeros = sample[0::2].count(0)
+    odd_zeros = sample[1::2].count(0)
+    if odd_zeros > half * 0.3 and even_zeros < half * 0.05:
+        return "utf-16-le"
+    if even_zeros > half * 0.3 and odd_zeros < half * 0.05:
+        return "utf-16-be"
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=complete)
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+    try:
+        sample.decode("cp1252")
+        return "cp1252"
+    except UnicodeDecodeError:
+        return "latin-1"
+
+
+def detect_format(sample, complete=True):
+    for bom, encoding in _BYTE_ORDER_MARKS:
+        if sample.startswith(bom):
+            break
+    else:
+        bom = b""
+        encoding = _guess_encoding(sample, complete)
+
+    text = codecs.getincrementaldecoder(encoding)(errors="replace").decode(sample[len(bom):])
+    if not complete and text.endswith("\r"):
+        # The sample may have cut a CRLF in two.
+        text = text[:-1]
+    crlf = text.count("\r\n")
+    counts = {"\r\n": crlf, "\n": text.count("\n") - crlf, "\r": text.count("\r") - crlf}
+    seen = [newline for newline, count in counts.items() if count]
+    newline = max(seen, key=counts.get) if seen else os.linesep
+    return FileFormat(encoding, bom, newline, len(seen) > 1, bool(seen))
+
+
+def detect_file_format(path, sample_size=FORMAT_SAMPLE_SIZE):
+    with open(path, "rb") as file:
+        sample = file.read(sample_size + 1)
+    return detect_format(sample[:sample_size], complete=len(sample) <= sample_size)
+
+
+def chunk_counts(text, previous=""):
+    words = count_words(previous + text) - (1 if previous and not previous.isspace() else 0)
+    return (len(text), words, text.count("\n"), len(text.encode("utf-8", "surrogatepass")))
+
+
+class FileLoader:
+    first_chunk_size = 1 << 16
+    chunk_size = 1 << 20
+
+    def __init__(self, path, file_format=None):
+        self.path = path
+        self.file_format = file_format or detect_file_format(path)
+        self.total_size = os.path.getsize(path)
+        self.bytes_read = 0
+        self.done = False
+        self.error = None
+        self.chunks = queue.SimpleQueue()
+        self._cancelled = threading.Event()
+        self._thread = threading.Thread(target=self._read, daemon=True)
+        self._thread.start()
+
+    @property
+    def progress(self):
+        return self.bytes_read / self.total_size if self.total_size else 1.0
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def _decoder(self, encoding):
+        return io.IncrementalNewlineDecoder(codecs.getincrementaldecoder(encoding)(), translate=True)
+
+    def _read(self):
+        file_format = self.file_format
+        decoder = self._decoder(file_format.encoding)
+        previous = ""
+        ascii_only = True
+        try:
+            with open(self.path, "rb") as file:
+                file.seek(len(file_format.bom))
+                self.bytes_read = len(file_format.bom)
+                size = self.first_chunk_size
+                while not self._cancelled.is_set():
+                    data = file.read(size)
+                    size = self.chunk_size
+                    try:
+                        text = decoder.decode(data, final=not data)
+                    except UnicodeDecodeError:
+                        if file_format.encoding != "utf-8" or not ascii_only:
+                            raise
+                        buffered, flag = decoder.getstate()
+                        file_format.encoding = _guess_encoding(data, complete=True)
+                        if file_format.encoding not in ASCII_COMPATIBLE_ENCODINGS:
+                            file_format.encoding = "cp1252"
+                        decoder = self._decoder(file_format.encoding)
+                        text = decoder.decode(b"\r" * (flag & 1) + buffered + data, final=not data)
+                    self.bytes_read += len(data)
+                    if text:
+                        ascii_only = ascii_only and text.isascii()
+                        self.chunks.put((text, chunk_counts(text, previous)))
+                        previous = text[-1]
+                    if not data:
+                        break
+            file_format.update_newlines(decoder.newlines)
+        except Exception as e:
+            self.error = e
+        self.done = True
+
+
+class LargeFileDocument:
+    index_stride = 16
+    index_block_size = 1 << 24
+    search_chunk_size = 1 << 25
+
+    def __init__(self, path, encoding="utf-8", bom=b""):
+        self.path = path
+        self.encoding = encoding
+        self._file = open(path, "rb")
+        try:
+            self.size = os.fstat(self._file.fileno()).st_size
+            self.mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+        self.line_count = 1
+        self.indexed = False
+        self._sampled_starts = array("q", [len(bom)])
+        self._closed = False
+        threading.Thread(target=self._build_index, daemon=True).start()
+
+    def close(self):
+        self._closed = True
+        try:
+            self.mmap.close()
+        except (BufferError, ValueError):
+            pass
+        self._file.close()
+
+    def _build_index(self):
+        stride = self.index_stride
+        next_line = 1
+        base = 0
+        carry = b""
+        try:
+            while base < self.size and not self._closed:
+                block = carry + self.mmap[base:base + self.index_block_size]
+                block_start = base - len(carry)
+                base += self.index_block_size
+                lines = block.split(b"\n")
+                carry = lines.pop()
+                starts = array("q", map(operator.add, itertools.accumulate(map(len, lines)), itertools.count(block_start + 1)))
+                self._sampled_starts.extend(starts[(-next_line) % stride::stride])
+                next_line += len(starts)
+                self.line_count = next_line
+        except ValueError:
+            return
+        self.indexed = not self._closed
+
+    @property
+    def index_progress(self):
+        if self.indexed or not self.size:
+            return 1.0
+        return min(1.0, self._sampled_starts[-1] / self.size)
+
+    def line_start(self, line):
+        if line >= self.line_count:
+            return self.size
+        position = self._sampled_starts[line // self.index_stride]
+        for _ in range(line % self.index_stride):
+            position = self.mmap.find(b"\n", position) + 1
+        return position
+
+    def line_of(self, position):
+        sample = bisect.bisect_right(self._sampled_starts, position) - 1
+        start = self._sampled_starts[sample]
+        return sample * self.index_stride + self.mmap[start:position].count(b"\n")
+
+    def decode(self, start, end):
+        text = self.mmap[start:end].decode(self.encoding, errors="replace")
+        return text.replace("\r\n", "\n").replace("\r", "\n")
+
+    def read_lines(self, first, count):
+        indexed = self.indexed
+        total = self.line_count
+        last = min(first + count, total if indexed else total - 1)
+        if last <= first:
+            return ""
+        if last == total:
+            return self.decode(self.line_start(first), self.size)
+        return self.decode(self.line_start(first), self.line_start(last))[:-1]
+
+    def column_of(self, position):
+        # Columns are in Tk's characters, for the window the view shows.
+        line = self.line_of(position)
+        return line, tk_length(self.decode(self.line_start(line), position))
+
+    def search_step(self, pattern, start, overlap):
+        end = min(self.size, start + self.search_chunk_size + overlap)
+        match = pattern.search(self.mmap, start, end)
+        if match is not None:
+            return match, None
+        start += self.search_chunk_size
+        return None, (start if start < self.size else None)
+
+
+SAVE_CHUNK_SIZE = 1 << 20
+
+
+def _text_chunks(text, size=SAVE_CHUNK_SIZE):
+    pieces = [(text, 0, len(text))] if isinstance(text, str) else text
+    for buffer, start, end in pieces:
+        for position in range(start, end, size):
+            yield buffer[position:min(position + size, end)]
+
+
+def write_file_atomic(path, text, file_format=None):
+    file_format = file_format or FileFormat()
+    # Replace the file a symlink points at, not the link itself.
+    path = os.path.realpath(path)
+    directory = os.path.dirname(path)
+    fd, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        with io.TextIOWrapper(os.fdopen(fd, "wb"), encoding=file_format.encoding, newline=file_format.newline) as file:
+            file.buffer.write(file_format.bom)
+            for chunk in _text_chunks(text):
+                file.write(chunk)
+            file.flush()
+            os.fsync(file.fileno())
+        if os.path.exists(path):
+            shutil.copymode(path, temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+    if os.name != "nt":
+        try:
+            dir_fd = os.open(directory, os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+        except OSError:
+            pass
+
+
+class SaveJob:
+    def __init__(self, path, text, generation, file_format, adopt_path=False, tab=None):
+        self.path = path
+        self.text = text
+        self.generation = generation
+        self.file_format = file_format
+        self.adopt_path = adopt_path
+        self.tab = tab
+
+
+class SaveWorker:
+    def __init__(self):
+        self.results = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._busy = False
+        self._idle = threading.Event()
+        self._idle.set()
+
+    @property
+    def busy(self):
+        return self._busy
+
+    def submit(self, job):
+        with self._lock:
+            self._pending.pop(job.path, None)
+            self._pending[job.path] = job
+            if not self._busy:
+                self._busy = True
+                self._idle.clear()
+                threading.Thread(target=self._run, daemon=True).start()
+
+    def wait(self, timeout=None):
+        return self._idle.wait(timeout)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._busy = False
+                    self._idle.set()
+                    return
+                path = next(iter(self._pending))
+                job = self._pending.pop(path)
+            try:
+                write_file_atomic(job.path, job.text, job.file_format)
+                error = None
+            except Exception as e:
+                error = e
+            job.text = None
+            self.results.put((job, error))
+
+
+SEARCH_CHUNK_SIZE = 1 << 20
+SEARCH_TIME_SLICE = 0.02
+TAG_BATCH_SIZE = 4096
+
+
+class SearchQuery:
+    def __init__(self, text, match_case=False, whole_word=False, regex=False):
+        self.text = text
+        self.match_case = match_case
+        self.whole_word = whole_word
+        self.regex = regex
+
+    def key(self):
+        return (self.text, self.match_case, self.whole_word, self.regex)
+
+    def __eq__(self, other):
+        return isinstance(other, SearchQuery) and self.key() == other.key()
+
+    def __hash__(self):
+        return hash(self.key())
+
+    def compile(self):
+        return _compile_search(*self.key())
+
+
+@functools.lru_cache(maxsize=64)
+def _compile_search(text, match_case, whole_word, regex):
+    source = text if regex else re.escape(text)
+    if whole_word:
+        source = rf"\b(?:{source})\b"
+    return re.compile(source, re.MULTILINE | (0 if match_case else re.IGNORECASE))
+
+
+def _has_border(text):
+    return any(text[k:] == text[:-k] for k in range(1, len(text)))
+
+
+class SearchEngine:
+    def prepare(self, text, query):
+        if query.regex:
+            return text, query.compile()
+        # A leading \b defeats the literal prefix scan, so literal whole word
+        # matches are found plainly and their boundaries checked afterwards.
+        # Case-insensitive scanning is several times slower than a
+        # case-sensitive one, so pure ASCII text is folded up front instead.
+        if not query.match_case and query.text.isascii() and text.isascii():
+            return text.lower(), SearchQuery(query.text.lower(), True).compile()
+        return text, SearchQuery(query.text, query.match_case).compile()
+
+    def scan(self, text, query, haystack, pattern, start=0, end=None):
+        end = len(haystack) if end is None else end
+        if not query.whole_word or query.regex:
+            return [match.span() for match in pattern.finditer(haystack, start, end) if match.end() > match.start()]
+        # A literal match that is not a whole word may hide an overlapping
+        # one that is, so the scan resumes just after a rejected start.
+        spans = []
+        search = pattern.search
+        found = search(haystack, start, end)
+        while found is not None:
+            first, last = found.span()
+            if last > first and _is_whole_word(text, first, last):
+                spans.append((first, last))
+                found = search(haystack, last, end)
+            else:
+                found = search(haystack, first + 1, end)
+        return spans
+
+    def find_all(self, text, query, start=0, end=None):
+        haystack, pattern = self.prepare(text, query)
+        return self.scan(text, query, haystack, pattern, start, end)
+
+    def can_refine(self, previous, query):
+        # Every match of a longer literal starts where a match of its prefix
+        # does, as long as the prefix cannot overlap itself and so no
+        # occurrence of it was skipped.
+        if previous.regex or query.regex or previous.whole_word:
+            return False
+        if previous.match_case != query.match_case:
+            return False
+        old, new = previous.text, query.text
+        if not query.match_case:
+            if not (old.isascii() and new.isascii()):
+                return False
+            old, new = old.lower(), new.lower()
+        return len(new) >= len(old) and new.startswith(old) and not _has_border(old)
+
+    def to_indices(self, text, offsets):
+        return IndexConverter(text).convert(offsets)
+
+
+class IndexConverter:
+    def __init__(self, text, first_line=1):
+        self.text = text
+        self.line = first_line
+        self.line_start = 0
+        self.position = 0
+        # Characters Tk counts twice between line_start and position.
+        self.wide = has_astral(text)
+        self.wides = 0
+
+    def convert(self, offsets):
+        text = self.text
+        indices = []
+        line = self.line
+        line_start = self.line_start
+        previous = self.position
+        wide = self.wide
+        wides = self.wides
+        for offset in offsets:
+            newlines = text.count("\n", previous, offset)
+            if newlines:
+                line += newlines
+                line_start = text.rfind("\n", previous, offset) + 1
+                previous = line_start
+                wides = 0
+            if wide:
+                wides += len(_ASTRAL.findall(text, previous, offset))
+            indices.append(f"{line}.{offset - line_start + wides}")
+            previous = offset
+        self.line = line
+        self.line_start = line_start
+        self.position = previous
+        self.wides = wides
+        return indices
+
+
+class SearchMatches:
+    block_size = 1024
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        # Matches live in blocks of sorted offsets. Each block carries a shift
+        # that is added to its stored offsets, so an edit only has to touch
+        # the block it lands in and bump the shift of the blocks after it.
+        self._starts = []
+        self._ends = []
+        self._shifts = []
+        self._firsts = []
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        block, position = self._locate(index)
+        shift = self._shifts[block]
+        return self._starts[block][position] + shift, self._ends[block][position] + shift
+
+    def _reindex(self):
+        firsts = []
+        total = 0
+        for starts in self._starts:
+            firsts.append(total)
+            total += len(starts)
+        self._firsts = firsts
+        self._count = total
+
+    def _locate(self, index):
+        block = bisect.bisect_right(self._firsts, index) - 1
+        return block, index - self._firsts[block]
+
+    def _bisect(self, blocks, offset):
+        low, high = 0, len(blocks)
+        while low < high:
+            middle = (low + high) // 2
+            if blocks[middle][-1] + self._shifts[middle] < offset:
+                low = middle + 1
+            else:
+                high = middle
+        if low == len(blocks):
+            return self._count
+        return self._firsts[low] + bisect.bisect_left(blocks[low], offset - self._shifts[low])
+
+    def bisect(self, offset):
+        return self._bisect(self._starts, offset)
+
+    def between(self, low, high):
+        return self.bisect(low), self.bisect(high)
+
+    def overlapping(self, low, high):
+        return self._bisect(self._ends, low + 1), self.bisect(high)
+
+    def spans(self, first, last):
+        starts = []
+        ends = []
+        while first < last:
+            block, position = self._locate(first)
+            shift = self._shifts[block]
+            stop = min(len(self._starts[block]), position + last - first)
+            starts.extend(start + shift for start in self._starts[block][position:stop])
+            ends.extend(end + shift for end in self._ends[block][position:stop])
+            first += stop - position
+        return starts, ends
+
+    def extend(self, spans):
+        self.replace(self._count, self._count, spans)
+
+    def replace(self, first, last, spans):
+        if self._starts:
+            if first < last:
+                low, high = self._locate(first)[0], self._locate(last - 1)[0]
+            else:
+                low = high = self._locate(min(first, self._count - 1))[0]
+            base = self._firsts[low]
+            starts, ends = self.spans(base, self._firsts[high] + len(self._starts[high]))
+        else:
+            low, high = 0, -1
+            base = 0
+            starts, ends = [], []
+
+        starts[first - base:last - base] = [start for start, end in spans]
+        ends[first - base:last - base] = [end for start, end in spans]
+        size = self.block_size
+        chunks = range(0, len(starts), size)
+        self._starts[low:high + 1] = [array("q", starts[index:index + size]) for index in chunks]
+        self._ends[low:high + 1] = [array("q", ends[index:index + size]) for index in chunks]
+        self._shifts[low:high + 1] = [0] * len(chunks)
+        self._reindex()
+
+    def apply(self, delta):
+        # Matches touching the edited range are dropped; everything after it
+        # moves by the change in length.
+        removed_end = delta.offset + len(delta.removed)
+        first = self._bisect(self._ends, delta.offset)
+        self.replace(first, self._bisect(self._starts, removed_end + 1), [])
+        growth = len(delta.inserted) - len(delta.removed)
+        if not growth or first >= self._count:
+            return
+        block, position = self._locate(first)
+        if position:
+            for blocks in (self._starts, self._ends):
+                values = blocks[block]
+                values[position:] = array("q", [value + growth for value in values[position:]])
+            block += 1
+        for index in range(block, len(self._shifts)):
+            self._shifts[index] += growth
+
+
+class SearchRun:
+    def __init__(self, engine, text, query, previous=None):
+        self.engine = engine
+        self.text = text
+        self.query = query
+        self.spans = []
+        self.done = False
+        self.generation = None
+        if previous is not None and previous.done and engine.can_refine(previous.query, query):
+            self._steps = self._refine([first for first, last in previous.spans])
+        else:
+            self._steps = self._find(*engine.prepare(text, query))
+
+    def step(self, budget=SEARCH_TIME_SLICE):
+        deadline = time.perf_counter() + budget
+        found = []
+        for spans in self._steps:
+            found.extend(spans)
+            if time.perf_counter() >= deadline:
+                break
+        else:
+            self.done = True
+        self.spans.extend(found)
+        return found
+
+    def _find(self, haystack, pattern):
+        engine = self.engine
+        if self.query.regex:
+            # A regular expression can match across any chunk boundary, so
+            # the scan is only interrupted between matches.
+            batch = []
+            for match in pattern.finditer(haystack):
+                if match.end() > match.start():
+                    batch.append(match.span())
+                if len(batch) >= TAG_BATCH_SIZE:
+                    yield batch
+                    batch = []
+            yield batch
+            return
+
+        size = len(haystack)
+        overlap = len(self.query.text) - 1
+        start = 0
+        while start < size:
+            end = min(start + SEARCH_CHUNK_SIZE, size)
+            spans = [span for span in engine.scan(self.text, self.query, haystack, pattern, start, min(end + overlap, size)) if span[0] < end]
+            yield spans
+            start = max(end, spans[-1][1]) if spans else end
+
+    def _refine(self, starts):
+        text = self.text
+        whole_word = self.query.whole_word
+        match = SearchQuery(self.query.text, self.query.match_case).compile().match
+        last = 0
+        for index in range(0, len(starts), TAG_BATCH_SIZE):
+            spans = []
+            for start in starts[index:index + TAG_BATCH_SIZE]:
+                if start < last:
+                    continue
+                found = match(text, start)
+                if found is not None and (not whole_word or _is_whole_word(text, *found.span())):
+                    spans.append(found.span())
+                    last = found.end()
+            yield spans
+
+
+def update_matches(engine, matches, document, query, delta):
+    # Brings the matches of query in document up to date with an edit that
+    # has just been applied to both.
+    matches.apply(delta)
+    size = len(document)
+    end = delta.offset + len(delta.inserted)
+    if query.regex:
+        # A regular expression is re-run over the edited lines.
+        low = document.line_start(document.line_of(delta.offset))
+        line = document.line_of(end) + 1
+        high = document.line_start(line) - (1 if line < document.line_count else 0)
+    else:
+        # A literal that can overlap itself ("aa") may shift every match
+        # after the edit, so the re-check runs on to the first offset no
+        # occurrence straddles; from there both scans agree.
+        low = max(0, delta.offset - len(query.text))
+        high = _unstraddled(engine, document, query, min(size, end + len(query.text)))
+    first, last = matches.overlapping(low, high)
+    if first < last:
+        low = min(low, matches[first][0])
+        high = max(high, matches[last - 1][1])
+
+    context_low = max(0, low - 1)
+    region = document.get(context_low, high + 1)
+    haystack, pattern = engine.prepare(region, query)
+    spans = engine.scan(region, query, haystack, pattern, low - context_low, high - context_low)
+    matches.replace(first, last, [(start + context_low, end + context_low) for start, end in spans])
+
+
+def _unstraddled(engine, document, query, position):
+    width = len(query.text)
+    size = len(document)
+    step = max(4096, 4 * width)
+    while width > 1 and position < size:
+        base = max(0, position - width + 1)
+        stop = min(size, position + step)
+        haystack, pattern = engine.prepare(document.get(base, stop), query)
+        limit = size if stop == size else stop - width + 1
+        while position < limit:
+            found = pattern.search(haystack, position - width + 1 - base, position + width - 1 - base)
+            if found is None:
+                return position
+            position = found.end() + base
+    return min(position, size)
+
+
+def replacements(engine, content, query, replace_text):
+    # Returns the (start, end) spans of query in content and the text that
+    # replaces each of them, expanding group references for regex queries.
+    if query.regex:
+        spans = []
+        texts = []
+        for match in query.compile().finditer(content):
+            spans.append(match.span())
+            texts.append(match.expand(replace_text))
+        return spans, texts
+    spans = engine.find_all(content, query)
+    return spans, [replace_text] * len(spans)
+
+
+def replacement_deltas(content, spans, texts):
+    # One delta per span, from the last to the first, so that each offset
+    # is still valid when its delta is applied.
+    for (first, last), text in zip(reversed(spans), reversed(texts)):
+        yield EditDelta(first, content[first:last], text)
+
+
+FIND_BATCH_FILES = 64
+FIND_BATCH_BYTES = 8 << 20
+FIND_MMAP_THRESHOLD = 8 << 20
+FIND_MAX_MATCHES_PER_FILE = 1000
+FIND_MAX_RESULTS = 100000
+FIND_PREVIEW_LENGTH = 200
+_SKIPPED_DIRECTORIES = {".git", ".hg", ".svn", "__pycache__"}
+
+
+def _looks_binary(sample, file_format):
+    return b"\0" in sample and not file_format.encoding.startswith("utf-16")
+
+
+def _find_in_text(text, query):
+    spans = SearchEngine().find_all(text, query)[:FIND_MAX_MATCHES_PER_FILE]
+    results = []
+    for (start, end), index in zip(spans, IndexConverter(text).convert(start for start, end in spans)):
+        # Results carry Python columns, like _find_in_mapped; the converter's
+        # are Tk's, which count an emoji twice.
+        line = int(index.split(".")[0])
+        line_start = text.rfind("\n", 0, start) + 1
+        column = start - line_start
+        line_end = text.find("\n", start)
+        preview = text[line_start:line_end if line_end >= 0 else len(text)]
+        results.append((line, column, end - start, preview.strip()[:FIND_PREVIEW_LENGTH]))
+    return results
+
+
+def _find_in_mapped(data, file_format, query):
+    # Large files are searched as bytes straight from the mapping, the same
+    # way large file mode does, so only matching lines are ever decoded.
+    encoding = file_format.encoding
+    needle = query.text.encode(encoding, errors="replace")
+    source = needle if query.regex else re.escape(needle)
+    if query.whole_word:
+        source = rb"\b(?:" + source + rb")\b"
+    pattern = re.compile(source, re.MULTILINE | (0 if query.match_case else re.IGNORECASE))
+
+    results = []
+    line = 1
+    line_start = position = len(file_format.bom)
+    for match in pattern.finditer(data, position):
+        start, end = match.span()
+        if start == end:
+            continue
+        newlines = data[position:start].count(b"\n")
+        if newlines:
+            line += newlines
+            line_start = data.rfind(b"\n", position, start) + 1
+        position = start
+        line_end = data.find(b"\n", start)
+        preview = data[line_start:line_end if line_end >= 0 else len(data)].decode(encoding, errors="replace")
+        column = len(data[line_start:start].decode(encoding, errors="replace"))
+        length = len(data[start:end].decode(encoding, errors="replace"))
+        results.append((line, column, length, preview.strip()[:FIND_PREVIEW_LENGTH]))
+        if len(results) >= FIND_MAX_MATCHES_PER_FILE:
+            break
+    return results
+
+
+def _find_in_file(path, query):
+    with open(path, "rb") as file:
+        size = os.fstat(file.fileno()).st_size
+        sample = file.read(FORMAT_SAMPLE_SIZE)
+        file_format = detect_format(sample, complete=len(sample) >= size)
+        if _looks_binary(sample, file_format):
+            return None
+        if size > FIND_MMAP_THRESHOLD and file_format.encoding in ASCII_COMPATIBLE_ENCODINGS:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return _find_in_mapped(data, file_format, query)
+        file.seek(len(file_format.bom))
+        text = file.read().decode(file_format.encoding, errors="replace")
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return _find_in_text(text, query)
+
+
+def _find_in_files(paths, query):
+    found = []
+    for path in paths:
+        try:
+            results = _find_in_file(path, query)
+        except (OSError, ValueError, re.error):
+            continue
+        if results:
+            found.append((path, results))
+    return len(paths), found
+
+
+class FileSearch:
+    def __init__(self, executor, workers, folder, query, patterns=("*",)):
+        self.folder = folder
+        self.query = query
+        self.patterns = patterns
+        self.results = queue.Queue()
+        self.files_scanned = 0
+        self.done = False
+        self.cancelled = False
+        self.error = None
+        self._executor = executor
+        self._window = 2 * workers
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def _batches(self):
+        batch = []
+        batch_size = 0
+        for root, dirs, files in os.walk(self.folder):
+            if self.cancelled:
+                return
+            dirs[:] = sorted(name for name in dirs if name not in _SKIPPED_DIRECTORIES)
+            for name in sorted(files):
+                if not any(fnmatch.fnmatch(name, pattern) for pattern in self.patterns):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    batch_size += os.path.getsize(path)
+                except OSError:
+                    continue
+                batch.append(path)
+                if len(batch) >= FIND_BATCH_FILES or batch_size >= FIND_BATCH_BYTES:
+                    yield batch
+                    batch = []
+                    batch_size = 0
+        if batch:
+            yield batch
+
+    def _run(self):
+        import concurrent.futures
+        pending = set()
+        try:
+            for batch in self._batches():
+                pending.add(self._executor.submit(_find_in_files, batch, self.query))
+                if len(pending) >= self._window:
+                    finished, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                    self._collect(finished)
+                if self.cancelled:
+                    break
+            while pending and not self.cancelled:
+                finished, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                self._collect(finished)
+        except Exception as e:
+            self.error = e
+        finally:
+            for future in pending:
+                future.cancel()
+            self.done = True
+
+    def _collect(self, futures):
+        for future in futures:
+            scanned, found = future.result()
+            self.files_scanned += scanned
+            if found:
+                self.results.put(found)
+
+
+class UndoHistory:
+    def __init__(self, document=None):
+        self.document = document
+        self.undo_stack = []
+        self.redo_stack = []
+        self.max_stack_size = 100
+        self.group_timeout = 1.0
+        self._group = None
+        self._grouping = False
+        self._last_time = 0.0
+        self._applying = False
+
+    def save_state(self):
+
+        self._group = None
+
+    def begin_group(self):
+        # Everything recorded until end_group() is undone as one step.
+        self._group = None
+        self._grouping = True
+
+    def end_group(self):
+        self._grouping = False
+        self._group = None
+
+    def record(self, delta):
+
+        if self._applying:
+            return
+        now = time.monotonic()
+        group = self._group
+        bulk = len(delta.inserted) + len(delta.removed) > 1
+        if group is None or not self._grouping and (bulk or self._starts_new_group(group[-1], delta, now)):
+            if len(self.undo_stack) >= self.max_stack_size:
+                self.undo_stack.pop(0)
+            group = self._group = []
+            self.undo_stack.append(group)
+        self._last_time = now
+        self.redo_stack.clear()
+
+        if self._grouping:
+            group.append(delta)
+        elif bulk:
+            group.append(delta)
+            self._group = None
+        elif not group or not self._merge(group[-1], delta):
+            group.append(EditDelta(delta.offset, delta.removed, delta.inserted))
+
+    def _starts_new_group(self, last, delta, now):
+        if now - self._last_time > self.group_timeout:
+            return True
+        if delta.inserted and last.inserted and not last.removed and not delta.removed:
+            if delta.offset != last.offset + len(last.inserted):
+                return True
+            return _is_word_char(delta.inserted[0]) and not _is_word_char(last.inserted[-1])
+        if delta.removed and last.removed and not last.inserted and not delta.inserted:
+            return delta.offset + len(delta.removed) != last.offset and delta.offset != last.offset
+        return True
+
+    def _merge(self, last, delta):
+        if delta.inserted and delta.offset == last.offset + len(last.inserted):
+            last.inserted += delta.inserted
+        elif delta.removed and delta.offset + len(delta.removed) == last.offset:
+            last.offset = delta.offset
+            last.removed = delta.removed + last.removed
+        elif delta.removed and delta.offset == last.offset:
+            last.removed += delta.removed
+        else:
+            return False
+        return True
+
+    def undo(self):
+
+        self.save_state()
+        if self.undo_stack:
+            group = self.undo_stack.pop()
+            self._apply(delta.inverted() for delta in reversed(group))
+            self.redo_stack.append(group)
+
+    def redo(self):
+
+        self.save_state()
+        if self.redo_stack:
+            group = self.redo_stack.pop()
+            self._apply(group)
+            self.undo_stack.append(group)
+
+    def _apply(self, deltas):
+        self._applying = True
+        try:
+            for delta in deltas:
+                self.document.apply(delta)
+        finally:
+            self._applying = False
+
+
+SESSION_VERSION = 1
+
+
+def session_directory():
+    if os.name == "nt":
+        return os.path.join(os.environ.get("APPDATA") or os.path.expanduser("~"), "Gnotepad")
+    base = os.environ.get("XDG_CONFIG_HOME") or os.path.join(os.path.expanduser("~"), ".config")
+    return os.path.join(base, "gnotepad")
+
+
+def compress_text(text, level=1):
+    compressor = zlib.compressobj(level)
+    parts = [compressor.compress(chunk.encode("utf-8", "surrogatepass")) for chunk in _text_chunks(text)]
+    parts.append(compressor.flush())
+    return b"".join(parts)
+
+
+def decompress_text(data):
+    return zlib.decompress(data).decode("utf-8", "surrogatepass")
+
+
+class CompressedText:
+    # Text compressed on a background thread. The pieces it is built from
+    # are immutable, so the editor carries on while it runs, and the text
+    # can still be read back from them until it finishes.
+    def __init__(self, text=None, data=None):
+        self._text = text
+        self._data = data
+        self._done = threading.Event()
+        if data is not None:
+            self._done.set()
+        else:
+            threading.Thread(target=self._compress, daemon=True).start()
+
+    def _compress(self):
+        try:
+            self._data = compress_text(self._text)
+            self._text = None
+        finally:
+            self._done.set()
+
+    @property
+    def data(self):
+        self._done.wait()
+        return self._data
+
+    def text(self):
+        text = self._text
+        if text is None:
+            return decompress_text(self.data)
+        if isinstance(text, str):
+            return text
+        return "".join(buffer[start:end] for buffer, start, end in text)
+
+
+def lock_file(path):
+    # Opens path and takes an exclusive lock on it without waiting. Returns
+    # the open file, or None if another process holds the lock. The lock is
+    # dropped when its process ends, however it ends.
+    try:
+        file = open(path, "a+b")
+    except OSError:
+        return None
+    try:
+        if os.name == "nt":
+            import msvcrt
+            file.seek(0)
+            msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        file.close()
+        return None
+    return file
+
+
+def _write_bytes_atomic(path, data):
+    fd, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+class SessionStore:
+    def __init__(self, directory=None):
+        self.directory = directory or session_directory()
+        self.path = os.path.join(self.directory, "session.json")
+        self.buffers = os.path.join(self.directory, "buffers")
+        self._lock = None
+        self._saving = None
+
+    @property
+    def owned(self):
+        return self._lock is not None
+
+    def claim(self):
+        # The session belongs to one instance at a time. The others neither
+        # restore it nor save over it, and keep their hands off its buffers.
+        if self._lock is None:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+            except OSError:
+                return False
+            self._lock = lock_file(os.path.join(self.directory, "session.lock"))
+        return self.owned
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                state = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(state, dict) or state.get("version") != SESSION_VERSION:
+            return None
+        return state
+
+    def read_buffer(self, name):
+        with open(os.path.join(self.buffers, name), "rb") as file:
+            return file.read()
+
+    def write_buffer(self, data):
+        # Buffers are named after their content, so an unchanged document
+        # is never written twice and the session file can be replaced last.
+        name = f"{zlib.crc32(data):08x}{len(data):08x}.z"
+        path = os.path.join(self.buffers, name)
+        if not os.path.exists(path):
+            os.makedirs(self.buffers, exist_ok=True)
+            _write_bytes_atomic(path, data)
+        return name
+
+    def save(self, state):
+        # A document's buffer is either the name of one already written or
+        # a CompressedText, written here.
+        if not self.owned:
+            raise OSError("The session is owned by another Gnotepad window")
+        os.makedirs(self.directory, exist_ok=True)
+        documents = []
+        for document in state["documents"]:
+            buffer = document.get("buffer")
+            if buffer is not None and not isinstance(buffer, str):
+                document = dict(document, buffer=self.write_buffer(buffer.data))
+            documents.append(document)
+        state = dict(state, documents=documents, version=SESSION_VERSION)
+        _write_bytes_atomic(self.path, json.dumps(state).encode("utf-8"))
+        keep = {document.get("buffer") for document in state["documents"]}
+        try:
+            names = os.listdir(self.buffers)
+        except OSError:
+            return
+        for name in names:
+            if name not in keep:
+                try:
+                    os.unlink(os.path.join(self.buffers, name))
+                except OSError:
+                    pass
+
+    def save_in_background(self, state):
+        # Skipped while the previous save is still running; the next
+        # interval picks the changes up.
+        if self._saving is not None and self._saving.is_alive():
+            return
+        self._saving = threading.Thread(target=self._save_quietly, args=(state,), daemon=True)
+        self._saving.start()
+
+    def _save_quietly(self, state):
+        try:
+            self.save(state)
+        except OSError:
+            pass
+
+    def wait(self):
+        if self._saving is not None:
+            self._saving.join()
+
+
+JOURNAL_MAGIC = b"GNJ1"
+JOURNAL_META = 0
+JOURNAL_CHECKPOINT = 1
+JOURNAL_EDIT = 2
+JOURNAL_COMPACT_BYTES = 4 << 20
+JOURNAL_SYNC_INTERVAL = 1.0
+JOURNAL_LOCK = "owner.lock"
+_JOURNAL_FIELDS = struct.Struct("<BQQI")
+_JOURNAL_CRC = struct.Struct("<I")
+
+
+def _journal_record(kind, payload, offset=0, removed=0):
+    fields = _JOURNAL_FIELDS.pack(kind, offset, removed, len(payload))
+    return _JOURNAL_CRC.pack(zlib.crc32(payload, zlib.crc32(fields))) + fields + payload
+
+
+def replay_journal(path):
+    with open(path, "rb") as file:
+        data = file.read()
+    if not data.startswith(JOURNAL_MAGIC):
+        raise ValueError("not a journal file")
+
+    meta = None
+    document = PieceTable()
+    position = len(JOURNAL_MAGIC)
+    header_size = _JOURNAL_CRC.size + _JOURNAL_FIELDS.size
+    # A torn or corrupted record ends the replay; everything before it
+    # was written completely and is kept.
+    while position + header_size <= len(data):
+        crc, = _JOURNAL_CRC.unpack_from(data, position)
+        kind, offset, removed, size = _JOURNAL_FIELDS.unpack_from(data, position + _JOURNAL_CRC.size)
+        start = position + header_size
+        payload = data[start:start + size]
+        if len(payload) < size or zlib.crc32(payload, zlib.crc32(data[position + _JOURNAL_CRC.size:start])) != crc:
+            break
+        position = start + size
+        if kind == JOURNAL_META:
+            meta = json.loads(payload.decode("utf-8"))
+        elif kind == JOURNAL_CHECKPOINT:
+            document.clear()
+            document.insert(0, decompress_text(payload))
+        elif kind == JOURNAL_EDIT:
+            if offset + removed > len(document):
+                break
+            document.delete(offset, removed)
+            document.insert(offset, payload.decode("utf-8", "surrogatepass"))
+    if meta is None:
+        raise ValueError("journal has no checkpoint")
+    return meta, document.text()
+
+
+def find_journals(directory):
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return []
+    return sorted(os.path.join(directory, name) for name in names if name.endswith(".journal"))
+
+
+def orphaned_journals(root, own=None):
+    # Each running instance journals into its own directory under root and
+    # holds the lock file in it. A directory whose lock can be taken belongs
+    # to an instance that has exited; returns (directory, journals) pairs.
+    try:
+        names = sorted(os.listdir(root))
+    except OSError:
+        return []
+    orphans = []
+    for name in names:
+        directory = os.path.join(root, name)
+        if directory == own or not os.path.isdir(directory):
+            continue
+        lock = lock_file(os.path.join(directory, JOURNAL_LOCK))
+        if lock is None:
+            continue
+        lock.close()
+        orphans.append((directory, find_journals(directory)))
+    return orphans
+
+
+class JournalWriter:
+    def __init__(self, root):
+        self.root = root
+        self.directory = os.path.join(root, f"{os.getpid()}-{time.time_ns():x}")
+        self.error = None
+        self._lock = None
+        self._queue = queue.SimpleQueue()
+        self._files = {}
+        self._unsynced = set()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def checkpoint(self, name, meta, text):
+        self._queue.put(("checkpoint", name, meta, text))
+
+    def append(self, name, delta):
+        self._queue.put(("append", name, delta.offset, len(delta.removed), delta.inserted))
+
+    def discard(self, name):
+        self._queue.put(("discard", name))
+
+    def remove(self, path):
+        # Removes another instance's leftover file or empty directory, in
+        # order with the checkpoints queued before it.
+        self._queue.put(("remove", path))
+
+    def close(self, discard=False):
+        self._queue.put(("close", discard))
+        self._thread.join()
+
+    def _run(self):
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                operation, *args = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                self._sync()
+                deadline = None
+                continue
+            try:
+                if operation == "close":
+                    self._close(*args)
+                    return
+                getattr(self, "_" + operation)(*args)
+                if self._queue.empty():
+                    for name in self._unsynced:
+                        self._files[name].flush()
+            except OSError as e:
+                self.error = e
+            if self._unsynced and deadline is None:
+                deadline = time.monotonic() + JOURNAL_SYNC_INTERVAL
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _file(self, name):
+        file = self._files.get(name)
+        if file is None:
+            file = self._files[name] = open(self._path(name), "ab")
+        return file
+
+    def _checkpoint(self, name, meta, text):
+        self._release(name)
+        if self._lock is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._lock = lock_file(os.path.join(self.directory, JOURNAL_LOCK))
+        data = b"".join((
+            JOURNAL_MAGIC,
+            _journal_record(JOURNAL_META, json.dumps(meta).encode("utf-8")),
+            _journal_record(JOURNAL_CHECKPOINT, compress_text(text)),
+        ))
+        _write_bytes_atomic(self._path(name), data)
+
+    def _append(self, name, offset, removed, inserted):
+        record = _journal_record(JOURNAL_EDIT, inserted.encode("utf-8", "surrogatepass"), offset, removed)
+        self._file(name).write(record)
+        self._unsynced.add(name)
+
+    def _discard(self, name):
+        self._release(name)
+        try:
+            os.unlink(self._path(name))
+        except OSError:
+            pass
+
+    def _remove(self, path):
+        try:
+            if os.path.isdir(path):
+                os.rmdir(path)
+            else:
+                os.unlink(path)
+        except OSError:
+            pass
+
+    def _release(self, name):
+        self._unsynced.discard(name)
+        file = self._files.pop(name, None)
+        if file is not None:
+            file.close()
+
+    def _sync(self):
+        for name in self._unsynced:
+            try:
+                file = self._files[name]
+                file.flush()
+                os.fsync(file.fileno())
+            except OSError as e:
+                self.error = e
+        self._unsynced.clear()
+
+    def _close(self, discard):
+        self._sync()
+        for name in list(self._files):
+            if discard:
+                self._discard(name)
+            else:
+                self._release(name)
+        if discard:
+            for path in find_journals(self.directory):
+                self._remove(path)
+        if self._lock is not None:
+            self._lock.close()
+            self._lock = None
+            if discard:
+                self._remove(os.path.join(self.directory, JOURNAL_LOCK))
+                self._remove(self.directory)
+
+
+PALETTE_RESULT_LIMIT = 50
+_WORD_START = re.compile(r"\b\w")
+
+
+def _fuzzy_score(query, text, starts):
+    score = 0
+    position = -1
+    for char in query:
+        found = text.find(char, position + 1)
+        if found < 0:
+            return None
+        if found == position + 1:
+            score += 8
+        if found in starts:
+            score += 10
+        position = found
+    return score * 64 - len(text)
+
+
+class FuzzyIndex:
+    def __init__(self, entries):
+        self.entries = list(entries)
+        self._texts = [text.lower() for text, _value in self.entries]
+        self._starts = [frozenset(match.start() for match in _WORD_START.finditer(text)) for text in self._texts]
+        # One bitmap per character and repeat count, bit i set when entry i
+        # contains it that often, so the entries that can match a query are
+        # found with a few ANDs.
+        positions = {}
+        for index, text in enumerate(self._texts):
+            for char, count in collections.Counter(text).items():
+                for repeat in range(1, min(count, 3) + 1):
+                    positions.setdefault((char, repeat), []).append(index)
+        self._postings = {}
+        for char, indices in positions.items():
+            bitmap = bytearray(len(self._texts) // 8 + 1)
+            for index in indices:
+                bitmap[index >> 3] |= 1 << (index & 7)
+            self._postings[char] = int.from_bytes(bitmap, "little")
+        self._all = (1 << len(self.entries)) - 1
+        self._query = ""
+        self._remaining = self._all
+
+    def search(self, query, limit=PALETTE_RESULT_LIMIT):
+        query = "".join(query.lower().split())
+        if not query:
+            self._query = ""
+            self._remaining = self._all
+            return self.entries[:limit]
+
+        # Anything matching a query also matches every prefix of it, so
+        # typing on only needs the entries the previous query left.
+        candidates = self._remaining if query.startswith(self._query) else self._all
+        for char, count in collections.Counter(query).items():
+            candidates &= self._postings.get((char, min(count, 3)), 0)
+
+        # Entries are kept in order of preference, so scoring stops once a
+        # page of matches has been found; the rest stay candidates.
+        scored = []
+        matched = 0
+        while candidates and len(scored) < limit:
+            low = candidates & -candidates
+            candidates ^= low
+            index = low.bit_length() - 1
+            score = _fuzzy_score(query, self._texts[index], self._starts[index])
+            if score is not None:
+                scored.append((-score, index))
+                matched |= low
+        self._query = query
+        self._remaining = matched | candidates
+        scored.sort()
+        return [self.entries[index] for _score, index in scored[:limit]]
@@ -0,0 +1,188 @@
+import os
+import random
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import gnotepad_core
+from gnotepad_core import (
+    EditDelta, IndexConverter, PieceTable, SearchEngine, SearchMatches, SearchQuery, SearchRun,
+    UndoHistory, detect_format, replacement_deltas, replacements, tk_length, update_matches,
+    write_file_atomic,
+)
+
+
+def tk_index(text, offset):
+    line_start = text.rfind("\n", 0, offset) + 1
+    return f"{text.count(chr(10), 0, offset) + 1}.{tk_length(text[line_start:offset])}"
+
+
+class TkIndexTest(unittest.TestCase):
+    # Tk counts "😀" as two characters; Python counts it as one.
+
+    def test_emoji_columns(self):
+        document = PieceTable("😀b\nx😀😀y")
+        self.assertEqual(document.index(1), "1.2")
+        self.assertEqual(document.index(2), "1.3")
+        self.assertEqual(document.index(6), "2.5")
+        self.assertEqual(document.offset_of_index("1.2"), 1)
+        self.assertEqual(document.offset_of_index("1.3"), 2)
+        self.assertEqual(document.offset_of_index("2.5"), 6)
+
+    def test_typing_after_emoji(self):
+        document = PieceTable("😀b")
+        document.apply(EditDelta(document.offset_of_index("1.2"), "", "a"))
+        self.assertEqual(document.text(), "😀ab")
+
+    def test_random_edits(self):
+        rng = random.Random(7)
+        document = PieceTable()
+        text = ""
+        for _ in range(400):
+            offset = rng.randint(0, len(text))
+            removed = text[offset:offset + rng.randint(0, 3)]
+            inserted = "".join(rng.choice("ab\n😀é") for _ in range(rng.randint(0, 4)))
+            document.apply(EditDelta(offset, removed, inserted))
+            text = text[:offset] + inserted + text[offset + len(removed):]
+            for offset in range(len(text) + 1):
+                index = tk_index(text, offset)
+                self.assertEqual(document.index(offset), index)
+                self.assertEqual(document.offset_of_index(index), offset)
+        self.assertEqual(document.text(), text)
+
+    def test_index_converter(self):
+        text = "a😀b\n😀😀c\nd"
+        offsets = list(range(len(text) + 1))
+        self.assertEqual(IndexConverter(text).convert(offsets), [tk_index(text, offset) for offset in offsets])
+
+
+class ReplaceAllTest(unittest.TestCase):
+
+    def test_undo_as_one_step(self):
+        text = "one fish two fish red fish"
+        document = PieceTable(text)
+        history = UndoHistory(document)
+        spans, texts = replacements(SearchEngine(), text, SearchQuery("fish"), "cat")
+        document.replace_spans(text, spans, texts)
+        history.begin_group()
+        for delta in replacement_deltas(text, spans, texts):
+            history.record(delta)
+        history.end_group()
+        self.assertEqual(document.text(), "one cat two cat red cat")
+        self.assertEqual(len(history.undo_stack), 1)
+        history.undo()
+        self.assertEqual(document.text(), text)
+        history.redo()
+        self.assertEqual(document.text(), "one cat two cat red cat")
+
+    def test_rebuild_matches_span_edits(self):
+        text = "fish\n\U0001F600fish fish\nfishfish"
+        spans, texts = replacements(SearchEngine(), text, SearchQuery("fish"), "\U0001F41F\n")
+        edited = PieceTable(text)
+        for delta in replacement_deltas(text, spans, texts):
+            edited.apply(delta)
+        rebuilt = PieceTable(text)
+        rebuilt.replace_spans(text, spans, texts)
+        self.assertEqual(rebuilt.text(), edited.text())
+        self.assertEqual(rebuilt.line_count, edited.line_count)
+        self.assertEqual(rebuilt.index(len(rebuilt)), edited.index(len(edited)))
+
+
+class WholeWordTest(unittest.TestCase):
+
+    def run_search(self, text, query, previous=None):
+        run = SearchRun(SearchEngine(), text, query, previous)
+        while not run.done:
+            run.step()
+        return run
+
+    def test_overlapping_match(self):
+        query = SearchQuery("a a", whole_word=True)
+        self.assertEqual(SearchEngine().find_all("ba a a", query), [(3, 6)])
+        self.assertEqual(self.run_search("ba a a", query).spans, [(3, 6)])
+
+    def test_refined_overlapping_match(self):
+        previous = self.run_search("ba a a", SearchQuery("a"))
+        run = self.run_search("ba a a", SearchQuery("a a", whole_word=True), previous)
+        self.assertEqual(run.spans, [(3, 6)])
+
+
+class UpdateMatchesTest(unittest.TestCase):
+
+    def edit(self, document, matches, query, delta):
+        document.apply(delta)
+        update_matches(SearchEngine(), matches, document, query, delta)
+        return [matches[index] for index in range(len(matches))]
+
+    def test_self_overlapping_text(self):
+        query = SearchQuery("aa")
+        document = PieceTable("xx  aaa  ")
+        matches = SearchMatches()
+        matches.extend(SearchEngine().find_all(document.text(), query))
+        spans = self.edit(document, matches, query, EditDelta(4, "", "a"))
+        self.assertEqual(spans, [(4, 6), (6, 8)])
+
+    def test_random_edits(self):
+        engine = SearchEngine()
+        for seed in range(300):
+            rng = random.Random(seed)
+            text = "".join(rng.choice("aA b=\n") for _ in range(rng.randint(0, 40)))
+            query = SearchQuery(
+                "".join(rng.choice("aA =") for _ in range(rng.randint(1, 3))),
+                match_case=rng.random() < 0.5, whole_word=rng.random() < 0.5,
+            )
+            document = PieceTable(text)
+            matches = SearchMatches()
+            matches.extend(engine.find_all(text, query))
+            for _ in range(10):
+                offset = rng.randint(0, len(document))
+                removed = document.get(offset, offset + rng.randint(0, 3))
+                inserted = "".join(rng.choice("aA b=") for _ in range(rng.randint(0, 3)))
+                spans = self.edit(document, matches, query, EditDelta(offset, removed, inserted))
+                self.assertEqual(spans, engine.find_all(document.text(), query), seed)
+
+
+class FindInFilesTest(unittest.TestCase):
+
+    def test_python_columns_after_emoji(self):
+        text = "first\n\U0001F600\U0001F600 foo bar"
+        query = SearchQuery("foo")
+        expected = [(2, 3, 3, "\U0001F600\U0001F600 foo bar")]
+        self.assertEqual(gnotepad_core._find_in_text(text, query), expected)
+        data = text.encode("utf-8")
+        file_format = gnotepad_core.FileFormat("utf-8")
+        self.assertEqual(gnotepad_core._find_in_mapped(data, file_format, query), expected)
+
+
+class SaveTest(unittest.TestCase):
+
+    @unittest.skipUnless(hasattr(os, "symlink"), "needs symlinks")
+    def test_save_through_symlink(self):
+        with tempfile.TemporaryDirectory() as directory:
+            target = os.path.join(directory, "real.txt")
+            link = os.path.join(directory, "link.txt")
+            with open(target, "w") as file:
+                file.write("old")
+            try:
+                os.symlink(target, link)
+            except OSError:
+                self.skipTest("cannot create symlinks")
+            write_file_atomic(link, "new")
+            self.assertTrue(os.path.islink(link))
+            with open(target) as file:
+                self.assertEqual(file.read(), "new")
+
+
+class FormatTest(unittest.TestCase):
+
+    def test_sample_ending_inside_crlf(self):
+        file_format = detect_format(b"a\r\nb\r", complete=False)
+        self.assertEqual(file_format.newline, "\r\n")
+        self.assertFalse(file_format.mixed_newlines)
+        self.assertFalse(detect_format(b"ab\r", complete=False).newline_seen)
+
+
+if __name__ == "__main__":
+    unittest.main()